@@ -1,5 +1,7 @@
 """mychimp.py"""
 
+import collections
+import concurrent.futures
 import os
 import pygame as pg
 
@@ -13,16 +15,21 @@ data_dir = os.path.join(main_dir, 'data')
 print(f'main_dir={main_dir}')
 print(f'data_dir={data_dir}')
 
+TRANSFORM_BUDGET = 64 * 1024 * 1024    # bytes of transformed images
 
-def load_image(name, colorkey=None, scale=1):
-    """load image"""
+
+def decode_image(name, scale=1):
+    """load and scale image. It doesn't need the display."""
     fullname = os.path.join(data_dir, name)
     image = pg.image.load(fullname)
     size = image.get_size()
 
     size = (size[0] * scale, size[1] * scale)
-    image = pg.transform.scale(image, size)
+    return pg.transform.scale(image, size)
 
+
+def finish_image(image, colorkey=None):
+    """convert image for the display. On the main thread."""
     image = image.convert()
 
     if colorkey is not None:
@@ -32,13 +39,19 @@ def load_image(name, colorkey=None, scale=1):
     return image, image.get_rect()
 
 
+def load_image(name, colorkey=None, scale=1):
+    """load image"""
+    return finish_image(decode_image(name, scale), colorkey)
+
+
+class NoneSound:
+    """NoneSound class"""
+    def play(self):
+        pass
+
+
 def load_sound(name):
     """load sound"""
-    class NoneSound:
-        """NoneSound class"""
-        def play(self):
-            pass
-
     if not pg.mixer or not pg.mixer.get_init():
         return NoneSound()
 
@@ -47,12 +60,117 @@ def load_sound(name):
     return sound
 
 
+class SoundProxy:
+    """Plays the sound once it has loaded, and nothing before.
+    A sound which failed to load plays nothing, like NoneSound."""
+
+    def __init__(self, future):
+        self.future = future
+        self.sound = None
+
+    def play(self):
+        if self.sound is None:
+            if not self.future.done():
+                return
+            error = self.future.exception()
+            if error is None:
+                self.sound = self.future.result()
+            else:
+                print(f'Warning: sound not loaded. {error}')
+                self.sound = NoneSound()
+        self.sound.play()
+
+
+class Assets:
+    """Loads images and sounds on worker threads while the game runs.
+    The workers decode and scale. convert and colorkey, which depend on
+    the display, are done on the main thread when an image is asked for."""
+
+    def __init__(self, workers=4):
+        self.pool = concurrent.futures.ThreadPoolExecutor(workers)
+        self._decoding = {}     # (name, scale): future of the image
+        self._images = {}       # (name, colorkey, scale): (image, rect)
+        self._sounds = {}       # name: future of the sound
+
+    def prefetch(self, name, scale=1):
+        """Start decoding the image."""
+        key = name, scale
+        if key not in self._decoding:
+            self._decoding[key] = self.pool.submit(decode_image, name, scale)
+        return self._decoding[key]
+
+    def image(self, name, colorkey=None, scale=1, wait=True):
+        """Return (image, rect). If it is still decoding, wait for it,
+        or return None if not wait."""
+        key = name, colorkey, scale
+        if key not in self._images:
+            future = self.prefetch(name, scale)
+            if not wait and not future.done():
+                return None
+            self._images[key] = finish_image(future.result(), colorkey)
+        image, rect = self._images[key]
+        return image, rect.copy()
+
+    def sound(self, name):
+        """Return the sound, which plays nothing until it has loaded."""
+        if name not in self._sounds:
+            self._sounds[name] = self.pool.submit(load_sound, name)
+        return SoundProxy(self._sounds[name])
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+class TransformCache:
+    """Rotated and flipped images, made once and shared by every sprite.
+    Over the byte budget, the least recently used ones are dropped."""
+
+    def __init__(self, budget=TRANSFORM_BUDGET):
+        self.budget = budget
+        self.size = 0
+        self._cache = collections.OrderedDict()
+
+    def _get(self, key, transform):
+        entry = self._cache.get(key)
+        if entry is None:
+            image = transform()
+            nbytes = image.get_pitch() * image.get_height()
+            entry = image, image.get_rect(), nbytes
+            self._cache[key] = entry
+            self.size += entry[2]
+            while self.size > self.budget and len(self._cache) > 1:
+                self.size -= self._cache.popitem(last=False)[1][2]
+        else:
+            self._cache.move_to_end(key)
+        return entry[0], entry[1].copy()
+
+    def rotate(self, image, angle):
+        """Return the rotated image and its rect."""
+        angle %= 360
+        return self._get((image, 'rotate', angle),
+                         lambda: pg.transform.rotate(image, angle))
+
+    def flip(self, image, flip_x=True, flip_y=False):
+        """Return the flipped image and its rect."""
+        return self._get((image, 'flip', flip_x, flip_y),
+                         lambda: pg.transform.flip(image, flip_x, flip_y))
+
+    def clear(self):
+        self._cache.clear()
+        self.size = 0
+
+
+transforms = TransformCache()
+
+
 class Fist(pg.sprite.Sprite):
     """Moves a clenched fist on the screen. Following the mouse."""
 
-    def __init__(self):
+    def __init__(self, image=None):
         pg.sprite.Sprite.__init__(self)
-        self.image, self.rect = load_image('fist.png', -1)
+        if image is None:
+            image, _ = load_image('fist.png', -1)
+        self.image, self.rect = image, image.get_rect()
         self.fist_offset = (-235, -80)
         self.punching = False
 
@@ -78,11 +196,16 @@ class Fist(pg.sprite.Sprite):
 
 class Chimp(pg.sprite.Sprite):
     """Moves the monkey critter across the screen.
-    It can spin the monkey when it is punched."""
+    It can spin the monkey when it is punched.
+    Chimps made with the same image share its spin frames."""
 
-    def __init__(self) -> None:
+    def __init__(self, image=None) -> None:
         pg.sprite.Sprite.__init__(self)
-        self.image, self.rect = load_image('chimp.png', -1, 4)
+        if image is None:
+            image, _ = load_image('chimp.png', -1, 4)
+        self.base = image
+        self.facing_left = False
+        self.image, self.rect = image, image.get_rect()
         self.original = self.image
         self.rect.topleft = 10, 90
         self.move = 2
@@ -121,7 +244,9 @@ class Chimp(pg.sprite.Sprite):
                 self.area.right < self.rect.right):
                 self.move = -self.move
                 newpos = self.rect.move((self.move, 0))
-                self.image = pg.transform.flip(self.image, True, False)
+                self.facing_left = not self.facing_left
+                self.image = (transforms.flip(self.base)[0]
+                              if self.facing_left else self.base)
         self.rect = newpos
 
     def _spin(self):
@@ -131,10 +256,11 @@ class Chimp(pg.sprite.Sprite):
         if self.dizzy >= 360:
             self.dizzy = False
             self.image = self.original
+            self.rect = self.image.get_rect()
         else:
-            rotate = pg.transform.rotate
-            self.image = rotate(self.original, self.dizzy)
-        self.rect = self.image.get_rect(center=center)
+            self.image, self.rect = transforms.rotate(self.original,
+                                                      self.dizzy)
+        self.rect.center = center
 
 
 def main():
@@ -157,11 +283,14 @@ def main():
         textpos = text.get_rect(centerx=background.get_width() / 2, y=10)
         background.blit(text, textpos)
 
-    whiff_sound = load_sound('whiff.wav')
-    punch_sound = load_sound('punch.wav')
-    chimp = Chimp()
-    fist = Fist()
-    allsprites = pg.sprite.RenderPlain((chimp, fist))
+    # Loaded while the first frames show the background.
+    assets = Assets()
+    assets.prefetch('chimp.png', 4)
+    assets.prefetch('fist.png')
+    whiff_sound = assets.sound('whiff.wav')
+    punch_sound = assets.sound('punch.wav')
+    chimp = fist = None
+    allsprites = pg.sprite.RenderPlain()
     clock = pg.time.Clock()
 
     running = True
@@ -171,7 +300,7 @@ def main():
                 running = False
             elif event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
                 running = False
-            elif event.type == pg.MOUSEBUTTONDOWN:
+            elif event.type == pg.MOUSEBUTTONDOWN and chimp is not None:
                 if fist.punch(chimp):
                     chimp.speedup(True)
                     punch_sound.play()
@@ -179,9 +308,17 @@ def main():
                 else:
                     chimp.speedup(False)
                     whiff_sound.play() # miss
-            elif event.type == pg.MOUSEBUTTONUP:
+            elif event.type == pg.MOUSEBUTTONUP and fist is not None:
                 fist.unpunch()
 
+        if chimp is None:
+            chimp_image = assets.image('chimp.png', -1, 4, wait=False)
+            fist_image = assets.image('fist.png', -1, wait=False)
+            if chimp_image and fist_image:
+                chimp = Chimp(chimp_image[0])
+                fist = Fist(fist_image[0])
+                allsprites.add(chimp, fist)
+
         allsprites.update()
 
         screen.blit(background, (0, 0))
@@ -189,6 +326,7 @@ def main():
         pg.display.flip()
         clock.tick(60)
 
+    assets.close()
     pg.quit()
 
 
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+"""pong_env.py
+Headless, vectorized pong environments for training paddle AI.
+
+PongVecEnv steps N independent games of Tom's Pong at once in numpy
+arrays, with the court, speeds and tick rate of tompong, and no display.
+ProcessVecEnv splits the games into shards stepped in worker processes.
+
+Both have a gym-like vector API:
+    obs = env.reset()
+    obs, rewards, dones, info = env.step(actions)
+actions: (N, 2) directions of the left and right bats, -1 up, 0, 1 down.
+obs: (N, 6) float32 ball x, y, vx, vy, left bat y, right bat y in pixels.
+rewards: (N, 2) float32, +1 to the scorer and -1 to the one who missed.
+A finished game is served again at once, and its obs is the new serve.
+
+The court, sizes and speeds are those of tompong, and so are the
+collision rules of tompong.Ball: walls, the faces of the bats, and their
+tops and bottoms, with the ball moved before the bats in every tick.
+Differences from tompong.Ball:
+- A miss ends the game and serves again, where Ball bounces off the
+  side wall and goes on.
+- Impacts are resolved one after another by mirroring the overshoot,
+  not in time-of-impact order, so a ball hitting a wall and a bat in
+  the same tick may come out a few pixels off.
+
+usage: python pong_env.py [--envs 4096] [--steps 1000] [--workers 0]
+                         [--policy follow|intercept] [--error 0]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pygame
+
+import tompong
+
+
+def _image_size(name):
+    # Decoding is enough for the size, and needs no display.
+    return pygame.image.load(os.path.join(tompong.DATA_DIR, name)).get_size()
+
+
+COURT = tompong.COURT_SIZE
+BALL_SIZE = _image_size('pong_ball.png')[0]     # square
+BAT_SIZE = _image_size('pong_bat.png')
+BAT_SPEED = tompong.BAT_SPEED
+BALL_SPEED = tompong.BALL_SPEED
+MAX_SERVE = 0.6         # radian from horizontal
+
+
+class PongVecEnv:
+    """N pong games stepped together. One step is one physics tick.
+    Functions: reset, step, close
+    Attributes: num_envs, observation_size, scores"""
+
+    observation_size = 6
+
+    def __init__(self, num_envs, seed=None):
+        self.num_envs = num_envs
+        self.rng = np.random.default_rng(seed)
+        self.ball = np.zeros((num_envs, 2))
+        self.vel = np.zeros((num_envs, 2))
+        self.bats = np.zeros((num_envs, 2))     # y of the left, right bats
+        self.scores = np.zeros((num_envs, 2), dtype=np.int64)
+
+    def reset(self):
+        self.bats[:] = (COURT[1] - BAT_SIZE[1]) // 2
+        self.scores[:] = 0
+        self._serve(np.ones(self.num_envs, dtype=bool))
+        return self._obs()
+
+    def _serve(self, mask):
+        n = np.count_nonzero(mask)
+        if not n:
+            return
+        radian = self.rng.uniform(-MAX_SERVE, MAX_SERVE, n)
+        side = self.rng.choice((-1.0, 1.0), n)
+        self.ball[mask] = ((COURT[0] - BALL_SIZE) / 2,
+                           (COURT[1] - BALL_SIZE) / 2)
+        self.vel[mask, 0] = side * BALL_SPEED * np.cos(radian)
+        self.vel[mask, 1] = BALL_SPEED * np.sin(radian)
+
+    def _obs(self):
+        return np.concatenate((self.ball, self.vel, self.bats),
+                              axis=1).astype(np.float32)
+
+    def step(self, actions):
+        (w, h), (bat_w, bat_h) = COURT, BAT_SIZE
+        actions = np.clip(np.asarray(actions).reshape(self.num_envs, 2),
+                          -1, 1)
+
+        # The ball moves first, against the bats where they were,
+        # as in tompong.main.
+        ball, vel = self.ball, self.vel
+        prev_x, prev_y = ball.T.copy()
+        prev_vy = vel[:, 1].copy()
+        ball += vel
+        x, y = ball[:, 0], ball[:, 1]
+
+        # Top and bottom walls.
+        for wall, beyond in ((0, y < 0), (h - BALL_SIZE, y > h - BALL_SIZE)):
+            np.copyto(y, 2 * wall - y, where=beyond)
+            np.negative(vel[:, 1], out=vel[:, 1], where=beyond)
+
+        # Bats. A ball crossing the face of a bat, level with the bat
+        # when it crosses, is mirrored back.
+        for face, bat_y, crossing in (
+                (bat_w, self.bats[:, 0], (prev_x >= bat_w) & (x < bat_w)),
+                (w - bat_w - BALL_SIZE, self.bats[:, 1],
+                 (prev_x <= w - bat_w - BALL_SIZE)
+                 & (x > w - bat_w - BALL_SIZE))):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cross_y = prev_y + (face - prev_x) / vel[:, 0] * prev_vy
+            hit = (crossing & (cross_y + BALL_SIZE > bat_y)
+                   & (cross_y < bat_y + bat_h))
+            np.copyto(x, 2 * face - x, where=hit)
+            np.negative(vel[:, 0], out=vel[:, 0], where=hit)
+
+        # Tops and bottoms of the bats. A ball which was level with a bat,
+        # clear of it, and runs into it has come from above or below.
+        # A ball which a bat has moved onto passes, as it does in Ball.
+        for left, bat_y in ((0, self.bats[:, 0]),
+                            (w - bat_w, self.bats[:, 1])):
+            level = ((prev_x < left + bat_w) & (prev_x + BALL_SIZE > left)
+                     & ((prev_y >= bat_y + bat_h)
+                        | (prev_y + BALL_SIZE <= bat_y)))
+            inside = (level & (x < left + bat_w) & (x + BALL_SIZE > left)
+                      & (y < bat_y + bat_h) & (y + BALL_SIZE > bat_y))
+            down = vel[:, 1] > 0
+            np.copyto(y, 2 * (bat_y - BALL_SIZE) - y, where=inside & down)
+            np.copyto(y, 2 * (bat_y + bat_h) - y, where=inside & ~down)
+            np.negative(vel[:, 1], out=vel[:, 1], where=inside)
+
+        # Side walls. The ball has passed a bat.
+        left_missed = x <= 0
+        right_missed = x >= w - BALL_SIZE
+        rewards = np.zeros((self.num_envs, 2), dtype=np.float32)
+        rewards[left_missed] = (-1, 1)
+        rewards[right_missed] = (1, -1)
+        self.scores[left_missed, 1] += 1
+        self.scores[right_missed, 0] += 1
+        dones = left_missed | right_missed
+        self._serve(dones)
+
+        # Bats don't move at all if the move would leave the court,
+        # the same as Bat.update.
+        moved = self.bats + actions * BAT_SPEED
+        np.copyto(self.bats, moved,
+                  where=(moved >= 0) & (moved <= h - bat_h))
+        return self._obs(), rewards, dones, {'scores': self.scores.copy()}
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _worker(conn, num_envs, seed):
+    env = PongVecEnv(num_envs, seed)
+    while True:
+        command, data = conn.recv()
+        if command == 'step':
+            conn.send(env.step(data))
+        elif command == 'reset':
+            conn.send(env.reset())
+        else:
+            conn.close()
+            return
+
+
+class ProcessVecEnv:
+    """PongVecEnv split into shards which are stepped in worker processes.
+    Same API as PongVecEnv.
+    Functions: reset, step, close"""
+
+    observation_size = PongVecEnv.observation_size
+
+    def __init__(self, num_envs, workers=None, seed=None):
+        workers = max(1, min(workers or os.cpu_count() or 1, num_envs))
+        self.num_envs = num_envs
+        sizes = [len(a) for a in np.array_split(np.arange(num_envs), workers)]
+        self.offsets = np.cumsum(sizes)[:-1]
+        seeds = np.random.SeedSequence(seed).spawn(workers)
+        self.conns = []
+        self.procs = []
+        for size, child_seed in zip(sizes, seeds):
+            conn, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=_worker,
+                                           args=(child, size, child_seed),
+                                           daemon=True)
+            proc.start()
+            child.close()
+            self.conns.append(conn)
+            self.procs.append(proc)
+
+    def reset(self):
+        for conn in self.conns:
+            conn.send(('reset', None))
+        return np.concatenate([conn.recv() for conn in self.conns])
+
+    def step(self, actions):
+        actions = np.asarray(actions).reshape(self.num_envs, 2)
+        for conn, part in zip(self.conns, np.split(actions, self.offsets)):
+            conn.send(('step', part))
+        obs, rewards, dones, infos = zip(*[conn.recv() for conn in self.conns])
+        return (np.concatenate(obs), np.concatenate(rewards),
+                np.concatenate(dones),
+                {'scores': np.concatenate([i['scores'] for i in infos])})
+
+    def close(self):
+        """Stop the workers. Safe to call more than once."""
+        for conn in self.conns:
+            conn.send(('close', None))
+            conn.close()
+        for proc in self.procs:
+            proc.join()
+        self.conns = []
+        self.procs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def follow_ball(obs):
+    """Simple policy. Each bat heads to the ball's height."""
+    target = obs[:, 1:2] + BALL_SIZE / 2 - BAT_SIZE[1] / 2
+    return np.sign(target - obs[:, 4:6]).astype(np.int8)
+
+
+class InterceptPolicy:
+    """Each bat heads to where the ball will cross it, with the wall
+    bounces solved analytically by tompong.predict_intercept,
+    and back to the middle while the ball heads away.
+    error: standard deviation of the aim in pixels, drawn once for every
+    approach of the ball in every game, as tompong.BatAI does."""
+
+    def __init__(self, error=0.0, seed=None):
+        self.error = error
+        self.rng = np.random.default_rng(seed)
+        self.heading = None     # (N, 2) whether the ball heads to the bat
+        self.miss = None        # (N, 2) aim offsets of the approaches
+
+    def __call__(self, obs):
+        x, y, vx, vy = obs[:, 0], obs[:, 1], obs[:, 2], obs[:, 3]
+        heading = np.column_stack((vx < 0, vx > 0))
+        if self.miss is None or self.miss.shape != heading.shape:
+            self.miss = np.zeros(heading.shape)
+            self.heading = ~heading
+        if self.error:
+            turned = heading != self.heading
+            self.miss[turned] = self.rng.normal(0, self.error,
+                                                np.count_nonzero(turned))
+        self.heading = heading
+
+        bottom = COURT[1] - BALL_SIZE
+        aims = np.column_stack((
+            tompong.predict_intercept(x, y, vx, vy, BAT_SIZE[0], 0, bottom),
+            tompong.predict_intercept(x, y, vx, vy,
+                                      COURT[0] - BAT_SIZE[0] - BALL_SIZE,
+                                      0, bottom))) + self.miss
+        aims = np.where(np.isnan(aims), bottom / 2, aims)
+        diff = aims + BALL_SIZE / 2 - BAT_SIZE[1] / 2 - obs[:, 4:6]
+        return (np.sign(diff) * (np.abs(diff) >= BAT_SPEED)).astype(np.int8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--envs', type=int, default=4096)
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=0,
+                        help='worker processes. 0 for in-process')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--policy', choices=('follow', 'intercept'),
+                        default='follow')
+    parser.add_argument('--error', type=float, default=0.0,
+                        help='aim error of the intercept policy in pixels')
+    args = parser.parse_args()
+
+    env = (ProcessVecEnv(args.envs, args.workers, args.seed) if args.workers
+           else PongVecEnv(args.envs, args.seed))
+    policy = (InterceptPolicy(args.error, args.seed)
+              if args.policy == 'intercept' else follow_ball)
+    obs = env.reset()
+    points = 0
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        obs, _, dones, _ = env.step(policy(obs))
+        points += int(np.count_nonzero(dones))
+    elapsed = time.perf_counter() - start
+    env.close()
+
+    print(json.dumps({
+        'envs': args.envs,
+        'steps': args.steps,
+        'workers': args.workers,
+        'policy': args.policy,
+        'error': args.error,
+        'env_steps_per_sec': args.envs * args.steps / elapsed,
+        'points': points,
+        'sim_seconds_per_sec': (args.envs * args.steps
+                                / tompong.TICK_RATE / elapsed),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
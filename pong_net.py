@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+"""pong_net.py
+Two-player network mode of Tom's Pong over UDP.
+
+The host is authoritative. It runs the physics, applies the client's
+inputs in order, and sends the state every tick, delta-compressed against
+the last state which the client has acknowledged. The client sends its
+input every tick, moves its own bat at once (client-side prediction),
+and replays the unacknowledged inputs on top of each state from the host.
+
+A LinkConditioner between an endpoint and its socket adds latency,
+jitter and loss, so the whole thing runs and can be measured over
+127.0.0.1.
+
+usage: python pong_net.py host [--port 5555]
+       python pong_net.py join HOST:PORT
+       python pong_net.py loopback [--ticks 600] [--latency 50] [--loss 0.1]
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import socket
+import statistics
+import struct
+import time
+
+import pygame
+
+import tompong
+
+PORT = 5555
+HISTORY = 128       # states kept to decode and encode deltas
+REDUNDANCY = 4      # inputs repeated in every input packet against loss
+MAX_BACKLOG = 8     # buffered inputs before the host skips ahead
+SCALE = 8           # positions are sent in 1/SCALE pixels
+
+INPUT_KIND = 1
+STATE_KIND = 2
+# kind, input seq, acked state seq, number of directions
+INPUT = struct.Struct('<BIIB')
+# kind, state seq, base state seq (0 for full state), last input seq, mask
+STATE = struct.Struct('<BIIIB')
+FIELDS = ('ball_x', 'ball_y', 'left_y', 'right_y')
+
+
+def quantize(value):
+    return max(-32768, min(32767, round(value * SCALE)))
+
+
+def snapshot(ball, left, right):
+    """Return the state to send as a tuple of FIELDS in 1/SCALE pixels."""
+    return (quantize(ball.pos.x), quantize(ball.pos.y),
+            quantize(left.rect.y), quantize(right.rect.y))
+
+
+def encode_state(seq, last_input, state, base_seq=0, base=None):
+    """Pack the state. Only the fields which differ from the base
+    are sent. Without a base, every field is sent."""
+    mask = 0
+    values = []
+    for i, value in enumerate(state):
+        if base is None or value != base[i]:
+            mask |= 1 << i
+            values.append(value)
+    if base is None:
+        base_seq = 0
+    return (STATE.pack(STATE_KIND, seq, base_seq, last_input, mask)
+            + struct.pack(f'<{len(values)}h', *values))
+
+
+def decode_state(data, history):
+    """Return (seq, last input seq, state) of the packet,
+    or None if its base state isn't in the history or it is malformed."""
+    if len(data) < STATE.size:
+        return None
+    _, seq, base_seq, last_input, mask = STATE.unpack_from(data)
+    if (mask >> len(FIELDS)
+            or len(data) != STATE.size + 2 * bin(mask).count('1')):
+        return None
+    if not base_seq and mask != (1 << len(FIELDS)) - 1:
+        return None     # a full state must have every field
+    base = history.get(base_seq)
+    if base_seq and base is None:
+        return None
+    values = iter(struct.unpack_from(f'<{bin(mask).count("1")}h',
+                                     data, STATE.size))
+    state = tuple(next(values) if mask & 1 << i else base[i]
+                  for i in range(len(FIELDS)))
+    return seq, last_input, state
+
+
+def set_direction(bat, direction):
+    """Move the bat up(-1), down(1) or stop(0) from the next tick."""
+    bat.movestop()
+    if direction < 0:
+        bat.moveup()
+    elif direction > 0:
+        bat.movedown()
+
+
+def step_bat(bat, y, direction):
+    """Return y of the bat after a tick, same as Bat.update does."""
+    newpos = bat.rect.copy()
+    newpos.y = y + direction * bat.speed
+    return newpos.y if bat.area.contains(newpos) else y
+
+
+class LinkConditioner:
+    """Simulated network link on the sending side.
+    Delays datagrams by latency plus random jitter (seconds) and drops
+    them with the loss probability. Counts what was sent.
+    The default is a perfect link."""
+
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.sent = 0
+        self.sent_bytes = 0
+        self.dropped = 0
+        self.transport = None
+        self.loop = None
+
+    def attach(self, transport):
+        self.transport = transport
+        self.loop = asyncio.get_running_loop()
+
+    def sendto(self, data, addr):
+        self.sent += 1
+        self.sent_bytes += len(data)
+        if self.loss and self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        delay = self.latency + self.rng.uniform(0, self.jitter)
+        if delay > 0:
+            self.loop.call_later(delay, self._send, data, addr)
+        else:
+            self._send(data, addr)
+
+    def _send(self, data, addr):
+        if not self.transport.is_closing():
+            self.transport.sendto(data, addr)
+
+
+class Endpoint(asyncio.DatagramProtocol):
+    """UDP endpoint. Hands received datagrams to the handler
+    and sends through the link conditioner."""
+
+    def __init__(self, handler, link=None):
+        self.handler = handler
+        self.link = link if link is not None else LinkConditioner()
+
+    def connection_made(self, transport):
+        self.link.attach(transport)
+
+    def datagram_received(self, data, addr):
+        self.handler(data, addr)
+
+    def sendto(self, data, addr):
+        self.link.sendto(data, addr)
+
+
+class Host:
+    """Authoritative side. Plays the left bat.
+    Functions: tick, datagram_received
+    Attributes: seq, last_input"""
+
+    def __init__(self, ball, left, right):
+        self.ball, self.left, self.right = ball, left, right
+        self.endpoint = None
+        self.peer = None
+        self.seq = 0
+        self.history = {}
+        self.acked = 0
+        self.inputs = {}        # input seq -> direction, not applied yet
+        self.last_input = 0
+        self.remote_dir = 0
+
+    def datagram_received(self, data, addr):
+        """Take the inputs of the client. The first valid input packet
+        decides who the client is, and packets from others are dropped."""
+        if self.peer is not None and addr != self.peer:
+            return
+        if len(data) < INPUT.size or data[0] != INPUT_KIND:
+            return
+        _, seq, ack, n = INPUT.unpack_from(data)
+        if len(data) != INPUT.size + n:
+            return
+        directions = struct.unpack_from(f'<{n}b', data, INPUT.size)
+        self.peer = addr
+        self.acked = max(self.acked, ack)
+        for i, direction in enumerate(directions):  # the latest first
+            if seq - i > self.last_input:
+                self.inputs.setdefault(seq - i, direction)
+
+    def _next_input(self):
+        """Apply the client's inputs one per tick in order.
+        Keep the last direction while the next one hasn't come."""
+        if len(self.inputs) > MAX_BACKLOG:
+            self.last_input = max(self.inputs) - 1
+            self.inputs = {s: d for s, d in self.inputs.items()
+                           if s > self.last_input}
+        direction = self.inputs.pop(self.last_input + 1, None)
+        if direction is not None:
+            self.last_input += 1
+            self.remote_dir = direction
+        return self.remote_dir
+
+    def tick(self, local_dir):
+        set_direction(self.left, local_dir)
+        set_direction(self.right, self._next_input())
+        self.ball.update()
+        self.left.update()
+        self.right.update()
+
+        self.seq += 1
+        state = snapshot(self.ball, self.left, self.right)
+        self.history[self.seq] = state
+        self.history.pop(self.seq - HISTORY, None)
+        if self.peer is not None:
+            base = self.history.get(self.acked)
+            self.endpoint.sendto(
+                encode_state(self.seq, self.last_input, state,
+                             self.acked, base), self.peer)
+
+
+class Client:
+    """Remote side. Plays the right bat.
+    Functions: tick, datagram_received
+    Attributes: latencies, corrections"""
+
+    def __init__(self, ball, left, right, host_addr):
+        self.ball, self.left, self.right = ball, left, right
+        # Resolved, to be compared with the source of the datagrams.
+        self.host_addr = (socket.gethostbyname(host_addr[0]), host_addr[1])
+        self.endpoint = None
+        self.seq = 0
+        self.pending = collections.deque()  # (input seq, direction)
+        self.history = {}
+        self.latest = 0
+        self.sent_at = {}       # input seq -> perf_counter()
+        self.latencies = []     # seconds from sending an input to its ack
+        self.corrections = 0    # predictions the host disagreed with
+
+    def tick(self, local_dir):
+        self.seq += 1
+        self.pending.append((self.seq, local_dir))
+        # Prediction: the own bat moves at once, not after a round trip.
+        bat = self.right
+        bat.prev_rect = bat.rect
+        bat.rect = bat.rect.move(0, step_bat(bat, bat.rect.y, local_dir)
+                                 - bat.rect.y)
+
+        directions = [d for _, d in self.pending][:-REDUNDANCY - 1:-1]
+        self.sent_at[self.seq] = time.perf_counter()
+        self.endpoint.sendto(
+            INPUT.pack(INPUT_KIND, self.seq, self.latest, len(directions))
+            + struct.pack(f'<{len(directions)}b', *directions),
+            self.host_addr)
+
+    def datagram_received(self, data, addr):
+        """Take the states from the host. Datagrams from others are dropped."""
+        if addr[:2] != self.host_addr or not data or data[0] != STATE_KIND:
+            return
+        decoded = decode_state(data, self.history)
+        if decoded is None or decoded[0] <= self.latest:
+            return  # unknown base, or older than what we have
+        seq, last_input, state = decoded
+        self.latest = seq
+        self.history[seq] = state
+        for old in [s for s in self.history if s <= seq - HISTORY]:
+            del self.history[old]
+
+        ball_x, ball_y, left_y, right_y = (v / SCALE for v in state)
+        ball = self.ball
+        ball.prev_pos.update(ball.pos)
+        ball.pos.update(ball_x, ball_y)
+        ball.rect.topleft = (round(ball_x), round(ball_y))
+        self.left.prev_rect = self.left.rect
+        self.left.rect = self.left.rect.move(0, round(left_y)
+                                             - self.left.rect.y)
+
+        now = time.perf_counter()
+        for s in [s for s in self.sent_at if s <= last_input]:
+            self.latencies.append(now - self.sent_at.pop(s))
+
+        # Reconciliation: replay the inputs the host hasn't applied yet.
+        while self.pending and self.pending[0][0] <= last_input:
+            self.pending.popleft()
+        y = round(right_y)
+        for _, direction in self.pending:
+            y = step_bat(self.right, y, direction)
+        if y != self.right.rect.y:
+            self.corrections += 1
+            self.right.rect = self.right.rect.move(0, y - self.right.rect.y)
+
+
+def make_court():
+    left = tompong.Bat('left')
+    right = tompong.Bat('right')
+    ball = tompong.Ball((tompong.RAD, tompong.BALL_SPEED), left, right)
+    return ball, left, right
+
+
+async def open_endpoint(side, local_addr, link=None):
+    loop = asyncio.get_running_loop()
+    transport, endpoint = await loop.create_datagram_endpoint(
+        lambda: Endpoint(side.datagram_received, link), local_addr=local_addr)
+    side.endpoint = endpoint
+    return transport
+
+
+async def play(role, addr, link=None):
+    """Play as 'host' on addr, or 'join' the host at addr."""
+    pygame.init()
+    screen = pygame.display.set_mode(tompong.COURT_SIZE)
+    pygame.display.set_caption(f'Basic Pong - {role}')
+    background = pygame.Surface(screen.get_size()).convert()
+    background.fill('black')
+
+    ball, left, right = make_court()
+    if role == 'host':
+        side = Host(ball, left, right)
+        transport = await open_endpoint(side, addr, link)
+    else:
+        side = Client(ball, left, right, addr)
+        transport = await open_endpoint(side, ('0.0.0.0', 0), link)
+
+    players = tompong.InterpolatedGroup(left, right)
+    balls = tompong.InterpolatedGroup(ball)
+    screen.blit(background, (0, 0))
+    pygame.display.flip()
+
+    tick = 1 / tompong.TICK_RATE
+    lag = 0.0
+    last = time.perf_counter()
+    running = True
+    while running:
+        now = time.perf_counter()
+        lag += min(now - last, tompong.MAX_FRAME_TIME)
+        last = now
+
+        inputs = tompong.sample_input()
+        if inputs.quit:
+            running = False
+        held = inputs.held
+        local_dir = ((pygame.K_z in held or pygame.K_DOWN in held)
+                     - (pygame.K_a in held or pygame.K_UP in held))
+        while lag >= tick:
+            side.tick(local_dir)
+            lag -= tick
+
+        balls.clear(screen, background)
+        players.clear(screen, background)
+        alpha = lag / tick
+        dirty = balls.draw(screen, alpha) + players.draw(screen, alpha)
+        pygame.display.update(dirty)
+
+        # Sleeping in asyncio lets the datagrams come in meanwhile.
+        await asyncio.sleep(max(0.0, 1 / tompong.FPS
+                                - (time.perf_counter() - now)))
+
+    transport.close()
+    pygame.quit()
+
+
+async def loopback(ticks=600, tick_time=None, latency=0.05, jitter=0.0,
+                   loss=0.0, seed=0):
+    """Play a host and a scripted client against each other over
+    127.0.0.1 and return the measures as a dict.
+    tick_time: real seconds per tick, 1 / TICK_RATE by default.
+    Needs a display surface, e.g. under the SDL dummy video driver."""
+    if tick_time is None:
+        tick_time = 1 / tompong.TICK_RATE
+    if pygame.display.get_surface() is None:
+        pygame.display.init()
+        pygame.display.set_mode(tompong.COURT_SIZE)
+
+    host = Host(*make_court())
+    host_link = LinkConditioner(latency, jitter, loss, seed)
+    client_link = LinkConditioner(latency, jitter, loss, seed + 1)
+    host_transport = await open_endpoint(host, ('127.0.0.1', 0), host_link)
+    client = Client(*make_court(),
+                    host_transport.get_extra_info('sockname')[:2])
+    client_transport = await open_endpoint(client, ('127.0.0.1', 0),
+                                           client_link)
+
+    rng = random.Random(seed)
+    direction = 0
+    start = time.perf_counter()
+    for i in range(ticks):
+        if i % 30 == 0:
+            direction = rng.choice((-1, 0, 1))
+        client.tick(direction)
+        host.tick(0)
+        await asyncio.sleep(max(0.0, start + (i + 1) * tick_time
+                                - time.perf_counter()))
+    await asyncio.sleep(2 * (latency + jitter) + 0.05)   # let packets land
+    host_transport.close()
+    client_transport.close()
+
+    lat = sorted(client.latencies) or [float('nan')]
+    return {
+        'ticks': ticks,
+        'latency_ms': latency * 1000,
+        'jitter_ms': jitter * 1000,
+        'loss': loss,
+        'host_bytes_per_tick': host_link.sent_bytes / ticks,
+        'client_bytes_per_tick': client_link.sent_bytes / ticks,
+        'host_packets_dropped': host_link.dropped,
+        'client_packets_dropped': client_link.dropped,
+        # Round trip of an input: sent until a state applying it is back.
+        'input_ack_ms': {
+            'mean': statistics.fmean(lat) * 1000,
+            'p95': lat[int(len(lat) * 0.95) - 1 if len(lat) > 1 else 0] * 1000,
+            'max': lat[-1] * 1000,
+        },
+        'inputs_acked': len(client.latencies),
+        'corrections': client.corrections,
+    }
+
+
+def parse_addr(text, default_host='0.0.0.0'):
+    host, _, port = text.rpartition(':')
+    return host or default_host, int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tom's Pong over UDP")
+    sub = parser.add_subparsers(dest='role', required=True)
+    host = sub.add_parser('host', help='serve a game')
+    host.add_argument('--port', type=int, default=PORT)
+    join = sub.add_parser('join', help='join a game at HOST:PORT')
+    join.add_argument('addr')
+    for p in (host, join):
+        p.add_argument('--latency', type=float, default=0, help='ms')
+        p.add_argument('--jitter', type=float, default=0, help='ms')
+        p.add_argument('--loss', type=float, default=0, help='0..1')
+    measure = sub.add_parser('loopback', help='measure over 127.0.0.1')
+    measure.add_argument('--ticks', type=int, default=600)
+    measure.add_argument('--latency', type=float, default=50, help='ms')
+    measure.add_argument('--jitter', type=float, default=0, help='ms')
+    measure.add_argument('--loss', type=float, default=0, help='0..1')
+    measure.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.role == 'loopback':
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        report = asyncio.run(loopback(args.ticks, None, args.latency / 1000,
+                                      args.jitter / 1000, args.loss,
+                                      args.seed))
+        print(json.dumps(report, indent=2))
+        return
+
+    link = LinkConditioner(args.latency / 1000, args.jitter / 1000, args.loss)
+    if args.role == 'host':
+        asyncio.run(play('host', ('0.0.0.0', args.port), link))
+    else:
+        asyncio.run(play('join', parse_addr(args.addr, '127.0.0.1'), link))
+
+
+if __name__ == '__main__':
+    main()
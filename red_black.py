@@ -2,7 +2,13 @@
 """Red/Black block. Choose more colored bricks."""
 
 # import sys
+import abc
+import functools
+import queue
+import threading
+import time
 
+import numpy as np
 import pygame
 
 pygame.init()
@@ -26,45 +32,335 @@ clock = pygame.time.Clock()
 text_area = (font.render(f'{MAX_HP}/{MAX_HP}', True, 'red')
              .get_rect(center=screen.get_rect().center))
 FPS = 60
+IDLE_TIMEOUT = 1000  # ms to wait for an event when nothing is animating
+BOARD_PREFETCH = 2   # boards made in advance
+BOARD_SEED = None   # set an int for reproducible boards
+LIVE_FLIPS = 0  # cells flipped every frame. 0 for the classic game.
 BOARD_SIZE = (5, 5)
+MAX_CHANGED = 10000  # changed cells remembered one by one, then repaint all
 BOARD_BLOCK_SIZE = 50
+GRID_WIDTH = 4
+GRID_MIN_PX = 20    # no grid lines for smaller cells
+# (pixels, cells) per block of each zoom level. From the closest.
+ZOOMS = ((BOARD_BLOCK_SIZE, 1), (25, 1), (10, 1), (5, 1), (2, 1), (1, 1),
+         (1, 2), (1, 4), (1, 8), (1, 16), (1, 32))
+VIEW_AREA = screen.get_rect().inflate(-120, -160)
+LINE_COLOR = 'whitesmoke'
 # pygame.key.set_repeat(1000 // FPS)
 
-def main():
+
+class Widget(abc.ABC):
+    """Retained-mode widget.
+    Keeps its state and draws itself only when the state has changed."""
+
+    def __init__(self):
+        self.dirty = True
+
+    def render(self):
+        """Draw if dirty. Return list of rects which have to be updated."""
+        if not self.dirty:
+            return []
+        self.dirty = False
+        rects = self.draw()
+        return rects if isinstance(rects, list) else [rects]
+
+    @abc.abstractmethod
+    def draw(self):
+        """Draw the widget. Return a rect or list of rects drawn."""
+
+    def _set(self, name, value):
+        if getattr(self, name, None) != value:
+            setattr(self, name, value)
+            self.dirty = True
+
+
+class HPWidget(Widget):
+    """HP gauge, redrawn when the HP changes."""
+
+    def __init__(self, hp):
+        super().__init__()
+        self.hp = hp
+        self.gauge = Gauge(
+            pygame.Rect(20, 20, 20, screen.get_rect().h - 40), MAX_HP)
+
+    def set_hp(self, hp):
+        self._set('hp', hp)
+
+    def draw(self):
+        return drawHP(self.gauge, self.hp)
+
+
+class Gauge:
+    """Segmented gauge which is filled from the bottom.
+    Strips of all full and all empty segments are pre-rendered once.
+    A change of the value blits only the span of the segments which
+    have changed, so the cost doesn't grow with the number of segments."""
+
+    def __init__(self, rect, segments, full='blue', empty='gray',
+                 outline='whitesmoke'):
+        self.segments = segments
+        self.seg_h = max(1, rect.h // segments)
+        self.rect = pygame.Rect(rect.x, rect.y, rect.w,
+                                self.seg_h * segments)
+        self.strips = (self._render_strip(empty, outline),
+                       self._render_strip(full, outline))
+        self.value = None
+
+    def _render_strip(self, color, outline):
+        image = pygame.Surface(self.rect.size).convert()
+        image.fill(color)
+        for i in range(self.segments):
+            pygame.draw.rect(image, outline,
+                             (0, i * self.seg_h, self.rect.w, self.seg_h),
+                             width=2)
+        return image
+
+    def _blit(self, full, first, last):
+        """Blit segments [first, last) counted from the top."""
+        area = pygame.Rect(0, first * self.seg_h,
+                           self.rect.w, (last - first) * self.seg_h)
+        return screen.blit(self.strips[full], self.rect.move(area.topleft),
+                           area)
+
+    def draw(self, value):
+        """Draw the gauge with value full segments, all of it the first time.
+        Return the list of rects which were drawn."""
+        old, self.value = self.value, value
+        n = self.segments
+        if old is None:
+            return [self._blit(False, 0, n - value),
+                    self._blit(True, n - value, n)]
+        if old == value:
+            return []
+        low, high = sorted((old, value))
+        return [self._blit(value > old, n - high, n - low)]
+
+
+class ButtonsWidget(Widget):
+    """Color buttons, redrawn when pushed or released."""
+
+    def __init__(self):
+        super().__init__()
+        self.pushed = [False, False]
+        self.rects = button_rects()
+
+    def set_pushed(self, pushed):
+        self._set('pushed', pushed)
+
+    def draw(self):
+        return draw_buttons(self.pushed)
+
+
+class BoardWidget(Widget):
+    """Scrollable and zoomable view of the board.
+    Only the cells in the view are painted into an offscreen surface,
+    so the cost depends on the view size, not on the board size.
+    Afterwards only the cells changed by Board.set are repainted."""
+
+    def __init__(self, board, painted=None):
+        super().__init__()
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.prev_rect = None   # union of the rects drawn since, to clear
+        self.set_board(board, painted)
+
+    def set_board(self, board, painted=None):
+        """painted: the default view painted by paint_view in advance."""
+        old = getattr(self, 'board', None)
+        if old is not None and old is not board:
+            old.track_changes = False
+            old.clear_changes()
+        board.track_changes = True
+        board.clear_changes()   # the whole view is painted anyway
+        self.board = board
+        self.zoom = 0
+        self.scroll = (0, 0)
+        self._layout(painted)
+
+    def pan(self, dx, dy):
+        scroll = (self.scroll[0] - dx, self.scroll[1] - dy)
+        if view_layout(self.board, self.zoom, scroll)[1] != self.scroll:
+            self.scroll = scroll
+            self._layout()
+
+    def zoom_at(self, pos, dz):
+        """Zoom in(dz < 0) or out(dz > 0) keeping the cell under pos."""
+        zoom = max(0, min(len(ZOOMS) - 1, self.zoom + dz))
+        if zoom == self.zoom:
+            return
+        (old_px, old_step), (new_px, new_step) = ZOOMS[self.zoom], ZOOMS[zoom]
+        x, y = pos[0] - self.rect.x, pos[1] - self.rect.y
+        self.scroll = tuple(round((s + p) * old_step / old_px
+                                  * new_px / new_step - p)
+                            for s, p in zip(self.scroll, (x, y)))
+        self.zoom = zoom
+        self._layout()
+
+    def _layout(self, painted=None):
+        # Several layouts may happen before a draw. All of them are cleared.
+        if self.rect:
+            self.prev_rect = (self.rect if self.prev_rect is None
+                              else self.prev_rect.union(self.rect))
+        self.rect, self.scroll = view_layout(self.board, self.zoom, self.scroll)
+        if painted is None:
+            painted = paint_view(self.board.cells, self.scroll,
+                                 self.rect.size, self.zoom)
+        self.surface = painted.convert()
+        self.full = True
+        self.dirty = True
+
+    def render(self):
+        if self.board.changed or self.board.repaint:
+            self.dirty = True
+        return super().render()
+
+    def draw(self):
+        changed = self.board.changed
+        cell_px = ZOOMS[self.zoom][0]
+        seen = (self.rect.w // cell_px + 1) * (self.rect.h // cell_px + 1)
+        if not self.full and (self.board.repaint or len(changed) > seen // 4):
+            # Cheaper to paint the view than to repaint most cells one by one.
+            self._layout()
+        areas = [] if self.full else self._repaint(changed)
+        self.board.clear_changes()
+        if not self.full:
+            return draw_board(self.surface, self.rect, areas)
+
+        self.full = False
+        rects = []
+        if self.prev_rect is not None and self.prev_rect != self.rect:
+            rects.append(screen.fill('gray', self.prev_rect))
+        self.prev_rect = None
+        return rects + draw_board(self.surface, self.rect)
+
+    def _repaint(self, cells):
+        """Repaint the cells in the view.
+        Return the repainted rects in the surface coordinates."""
+        rects = []
+        for r, c in cells:
+            area = self.cell_area(r, c)
+            if area:
+                rects.append(self.surface.fill(COLORS[self.board[r, c]], area))
+        return rects
+
+    def cell_area(self, r, c):
+        """Return the inner rect of the cell, without grid lines,
+        in the surface coordinates. None if the cell isn't seen."""
+        cell_px, step = ZOOMS[self.zoom]
+        if r % step or c % step:
+            return None    # not sampled at this level of detail
+        grid = cell_px >= GRID_MIN_PX
+
+        def span(i, n):
+            start, stop = i * cell_px, (i + 1) * cell_px
+            if grid:
+                start += GRID_WIDTH if i == 0 else GRID_WIDTH - 1
+                stop -= GRID_WIDTH if i == n - 1 else 1
+            return start, stop - start
+
+        x, w = span(c // step, -(-self.board.cols // step))
+        y, h = span(r // step, -(-self.board.rows // step))
+        area = pygame.Rect(x - self.scroll[0], y - self.scroll[1], w, h)
+        area = area.clip(self.surface.get_rect())
+        return area if area else None
+
+
+class BoardProducer:
+    """Generate, count and paint the next boards on a worker thread.
+    Boards are made in the same order from the seed,
+    so a run with the same seed gets the same boards."""
+
+    def __init__(self, w, h, prefetch=2, seed=None):
+        self.size = (w, h)
+        self.seed = np.random.SeedSequence(seed)
+        self.queue = queue.Queue(maxsize=prefetch)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            rng = np.random.default_rng(self.seed.spawn(1)[0])
+            board = make_board(*self.size, rng)
+            rect, scroll = view_layout(board, 0, (0, 0))
+            painted = paint_view(board.cells, scroll, rect.size, 0)
+            while not self._stop.is_set():
+                try:
+                    self.queue.put((board, painted), timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    def get(self):
+        """Return the next (board, painted surface). Block if not ready."""
+        return self.queue.get()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def main(bot=None, frames=None, stats=None):
+    """bot: called as bot(most_color, btn_rects) every frame to post events.
+    frames: quit after this many frames.
+    stats: dict which event handling seconds are added to, as 'events'."""
     HP = 5
     # digit = len(str(MAX_HP))
-    pushed = [False, False]
-    boards = make_board(BOARD_SIZE[0], BOARD_SIZE[1])
+    producer = BoardProducer(*BOARD_SIZE, BOARD_PREFETCH, BOARD_SEED)
+    boards, painted = producer.get()
     most_color = get_most_color(boards)
-
-    while True:
+    rng = np.random.default_rng(BOARD_SEED)
+
+    hp_widget = HPWidget(HP)
+    buttons = ButtonsWidget()
+    board_widget = BoardWidget(boards, painted)
+    widgets = (hp_widget, buttons, board_widget)
+    btn_rects = buttons.rects
+
+    frame = 0
+    running = True
+    while running and (frames is None or frame < frames):
+        frame += 1
         # msg = f'{HP:{digit}d}/{MAX_HP:{digit}d}'
         # text = font.render(msg, True, 'red').convert_alpha()
         # screen.fill('gray', text_area)
         # screen.blit(text, text_area)
-        
-        # update_area = [text_area]
-        update_area = []
-        update_area.append(drawHP(HP))
-        update_area += (btn_rects := draw_buttons(pushed))
-        update_area.append(draw_board(boards))
-        pygame.display.update(update_area)
-
-        for event in pygame.event.get():
+
+        if LIVE_FLIPS:
+            flip_cells(boards, LIVE_FLIPS, rng)
+            most_color = get_most_color(boards)
+
+        # Only changed widgets are redrawn and sent to the display.
+        hp_widget.set_hp(HP)
+        update_area = [rect for w in widgets for rect in w.render()]
+        if update_area:
+            pygame.display.update(update_area)
+
+        if bot is not None:
+            bot(most_color, btn_rects)
+        if LIVE_FLIPS:
+            events = pygame.event.get()
+        else:
+            # Nothing moves by itself. Sleep until the player does something.
+            events = wait_events(IDLE_TIMEOUT)
+        start = time.perf_counter()
+        for event in events:
             if event.type == pygame.QUIT:
                 # pygame.key.set_repeat()
-                pygame.quit()
-                return
+                running = False
+                break
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_UP:
                     HP = increase_hp(HP)
                 elif event.key == pygame.K_DOWN:
                     HP = decrease_hp(HP)
                 elif event.key == pygame.K_r:
-                    boards = make_board(BOARD_SIZE[0], BOARD_SIZE[1])
+                    boards, painted = producer.get()
                     most_color = get_most_color(boards)
-            elif event.type == pygame.MOUSEBUTTONUP:
-                pushed = [False, False]
+                    board_widget.set_board(boards, painted)
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                # Only the left button picks. The others pan, and the
+                # wheel posts buttons 4 and 5 as well.
+                buttons.set_pushed([False, False])
                 x, y = event.pos
                 pick_color = None
                 if btn_rects[0].collidepoint(x, y):
@@ -78,15 +374,34 @@ def main():
                     HP = increase_hp(HP)
                 else:
                     HP = decrease_hp(HP)
-            elif event.type == pygame.MOUSEBUTTONDOWN:
+            elif event.type == pygame.MOUSEWHEEL:
+                board_widget.zoom_at(pygame.mouse.get_pos(), -event.y)
+            elif event.type == pygame.MOUSEMOTION:
+                if event.buttons[1] or event.buttons[2]:
+                    board_widget.pan(*event.rel)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 x, y = event.pos
                 if btn_rects[0].collidepoint(x, y):
-                    pushed = [True, False]
+                    buttons.set_pushed([True, False])
                 elif btn_rects[1].collidepoint(x, y):
-                    pushed = [False, True]
+                    buttons.set_pushed([False, True])
+        if stats is not None:
+            stats['events'] = (stats.get('events', 0)
+                               + time.perf_counter() - start)
 
         clock.tick(FPS)
 
+    producer.close()
+    pygame.quit()
+
+
+def wait_events(timeout):
+    """Block until an event comes or timeout ms passes. Return the events."""
+    event = pygame.event.wait(timeout)
+    if event.type == pygame.NOEVENT:
+        return []
+    return [event] + pygame.event.get()
+
 
 def increase_hp(hp):
     return hp + 1 if hp < MAX_HP else MAX_HP
@@ -96,99 +411,216 @@ def decrease_hp(hp):
     return hp - 1 if hp > 0 else 0
 
 
-def make_board(w, h):
-    import random
-    return ([[random.randrange(len(COLORS)) for x in range(w)]
-             for y in range(h)])
+def count_colors(cells):
+    """Return number of cells for each color.
+    Same as np.bincount, but it doesn't widen uint8 cells to intp."""
+    return np.array([np.count_nonzero(cells == i) for i in range(len(COLORS))])
+
+
+class Board:
+    """Board of color indexes backed by a numpy array of shape (rows, cols).
+    Cells must be changed through set/set_region,
+    so that the color counts are kept up to date.
+    The changed cells are remembered only with track_changes,
+    which a BoardWidget turns on for the board it draws."""
+
+    def __init__(self, cells, track_changes=False):
+        self.cells = np.ascontiguousarray(cells, dtype=np.uint8)
+        self.track_changes = track_changes
+        self.changed = []   # (row, col) of cells set since last drawing
+        self.repaint = False    # too many changes to list, repaint all
+        self._counts = count_colors(self.cells)
+
+    def clear_changes(self):
+        self.changed.clear()
+        self.repaint = False
+
+    def set(self, r, c, color):
+        """Set color of a cell and remember it to repaint if tracked."""
+        old = self.cells[r, c]
+        if old != color:
+            self.cells[r, c] = color
+            self._counts[old] -= 1
+            self._counts[color] += 1
+            if self.track_changes and not self.repaint:
+                if len(self.changed) < MAX_CHANGED:
+                    self.changed.append((r, c))
+                else:
+                    self.changed.clear()
+                    self.repaint = True
+
+    def set_region(self, top, left, colors):
+        """Rewrite the region whose top-left cell is (top, left)
+        with the 2D array of colors."""
+        colors = np.asarray(colors, dtype=np.uint8)
+        if (colors.ndim != 2 or top < 0 or left < 0
+                or top + colors.shape[0] > self.rows
+                or left + colors.shape[1] > self.cols):
+            raise ValueError(f'region of shape {colors.shape} at '
+                             f'({top}, {left}) is out of the board')
+        region = self.cells[top:top + colors.shape[0],
+                            left:left + colors.shape[1]]
+        self._counts += count_colors(colors) - count_colors(region)
+        diff = region != colors
+        region[...] = colors
+        if not self.track_changes or self.repaint:
+            return
+        if len(self.changed) + np.count_nonzero(diff) > MAX_CHANGED:
+            # Listing the cells would cost more than repainting them.
+            self.changed.clear()
+            self.repaint = True
+        else:
+            self.changed.extend(
+                map(tuple, (np.argwhere(diff) + (top, left)).tolist()))
+
+    @property
+    def rows(self):
+        return self.cells.shape[0]
+
+    @property
+    def cols(self):
+        return self.cells.shape[1]
+
+    def __getitem__(self, key):
+        return self.cells[key]
+
+    def __len__(self):
+        return self.rows
+
+    def counts(self):
+        """Return number of cells for each color."""
+        return self._counts.copy()
+
+    def most_color(self):
+        """Return the color index which has the most cells."""
+        return int(self._counts.argmax())
+
+
+def flip_cells(board, n, rng):
+    """Flip n random cells to another color. For 'live' boards."""
+    rows = rng.integers(board.rows, size=n)
+    cols = rng.integers(board.cols, size=n)
+    shift = rng.integers(1, len(COLORS), size=n)
+    for r, c, d in zip(rows.tolist(), cols.tolist(), shift.tolist()):
+        board.set(r, c, (board[r, c] + d) % len(COLORS))
+
+
+def make_board(w, h, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    return Board(rng.integers(len(COLORS), size=(h, w), dtype=np.uint8))
 
 
 def get_most_color(board):
-    from collections import Counter
-    counter = Counter()
-    for row in board:
-        for col in row:
-            counter[col] += 1
-    return counter.most_common(1)[0][0]
-
-
-def draw_board(board):
-    size = BOARD_BLOCK_SIZE
-    rows = len(board)
-    cols = len(board[0])
-    screen_size = screen.get_rect().size
-    x = (screen_size[0] - cols * size) // 2
-    y = (screen_size[1] - rows * size) // 2
-
-    for r in range(rows):
-        for c in range(cols):
-            pygame.draw.rect(screen, 
-                             COLORS[board[r][c]],
-                             (x + c * size, y + r * size, size, size))
-    width = 4
-    correct = width // 2
-    LINE_COLOR = 'whitesmoke'
-    for r in range(1, rows):
-        start_pos = (x, y + r * size)
-        end_pos = (start_pos[0] + size * cols - correct, start_pos[1])
-        pygame.draw.line(screen, LINE_COLOR, start_pos, end_pos, width)
-
-    for c in range(1, cols):
-        start_pos = (x + c * size, y)
-        end_pos = (start_pos[0], start_pos[1] + size * rows - correct)
-        pygame.draw.line(screen, LINE_COLOR, start_pos, end_pos, width)
-
-    return pygame.draw.rect(screen, LINE_COLOR,
-                            (x, y, cols * size, rows * size), width)
-
-
-def drawHP(hp):
-    bar = pygame.rect.Rect(20, 20, 20, (screen.get_rect().h - 40) // MAX_HP)
-    pygame.draw.rect(screen, 'gray',
-                     (bar.x, bar.y, bar.w, bar.h * (MAX_HP - hp)))
-    pygame.draw.rect(screen, 'blue',
-                     (bar.x, bar.y + bar.h * (MAX_HP - hp), bar.w, bar.h * hp))
-    for i in range(MAX_HP):
-        pygame.draw.rect(screen, 'whitesmoke',
-                         (bar.x, bar.y + i * bar.h, bar.w, bar.h), width=2)
-    bar.h *= MAX_HP
-    return bar
-
-
-def draw_buttons(pushed):
+    return board.most_color()
+
+
+def view_layout(board, zoom, scroll):
+    """Return (view rect on the screen, clamped scroll) of the board
+    at the zoom level. The view is centered in VIEW_AREA."""
+    cell_px, step = ZOOMS[zoom]
+    total = (-(-board.cols // step) * cell_px, -(-board.rows // step) * cell_px)
+    rect = pygame.Rect(0, 0, min(total[0], VIEW_AREA.w),
+                       min(total[1], VIEW_AREA.h))
+    rect.center = VIEW_AREA.center
+    scroll = tuple(max(0, min(s, t - v))
+                   for s, t, v in zip(scroll, total, rect.size))
+    return rect, scroll
+
+
+def paint_view(cells, scroll, size, zoom):
+    """Paint the cells seen through the view into an 8 bit palette surface.
+    Cells and grid lines are composed as one index array, so the number of
+    draw calls doesn't depend on the board size, and the array is as big as
+    the view. Zoomed out, a block of step x step cells shows its top-left
+    cell. It doesn't touch the display, so it can run on a worker thread."""
+    cell_px, step = ZOOMS[zoom]
+    (sx, sy), (w, h) = scroll, size
+    c0, r0 = sx // cell_px, sy // cell_px
+    c1, r1 = -(-(sx + w) // cell_px), -(-(sy + h) // cell_px)
+    blocks = cells[r0 * step:r1 * step:step, c0 * step:c1 * step:step]
+    pixels = blocks.repeat(cell_px, axis=0).repeat(cell_px, axis=1)
+    oy, ox = sy - r0 * cell_px, sx - c0 * cell_px
+    pixels = pixels[oy:oy + h, ox:ox + w]
+
+    if cell_px >= GRID_MIN_PX:
+        line = len(COLORS)
+        for axis, (start, n) in enumerate(((sy, h), (sx, w))):
+            total = -(-cells.shape[axis] // step) * cell_px
+            p = np.arange(start, start + n)
+            # Same pixels as pygame.draw.line(..., GRID_WIDTH) on each
+            # boundary and pygame.draw.rect(..., GRID_WIDTH) on the border.
+            mask = (((p + 1) % cell_px < GRID_WIDTH)
+                    | (p < GRID_WIDTH) | (p >= total - GRID_WIDTH))
+            if axis == 0:
+                pixels[mask, :] = line
+            else:
+                pixels[:, mask] = line
+
+    surface = pygame.Surface((w, h), depth=8)
+    surface.set_palette([pygame.Color(c) for c in COLORS + (LINE_COLOR,)])
+    pygame.surfarray.blit_array(surface, pixels.T)
+    return surface
+
+
+def draw_board(surface, rect, areas=None):
+    """Blit the pre-rendered board. Blit only the areas if they are given."""
+    if areas is None:
+        return [screen.blit(surface, rect)]
+    return [screen.blit(surface, rect.move(area.topleft), area)
+            for area in areas]
+
+
+def drawHP(gauge, hp):
+    return gauge.draw(hp)
+
+
+def button_rects():
     screen_size = screen.get_rect().size
     size = 50
     gap = 10
     x = (screen_size[0] - size * 2 - gap) / 2
     y = screen_size[1] - size - screen_size[1] * 0.05
+    return [pygame.Rect(x, y, size, size),
+            pygame.Rect(x + size + gap, y, size, size)]
 
-    rects = []
-    rects.append(draw_button('red', (x, y, size, size), pushed[0]))
-    rects.append(draw_button('gray25', (x + size + gap, y, size, size), pushed[1]))
-    return rects
+
+def draw_buttons(pushed):
+    return [draw_button(color, rect, is_pushed)
+            for color, rect, is_pushed in zip(COLORS, button_rects(), pushed)]
 
 
 def draw_button(color, rect, pushed):
-    rect = pygame.draw.rect(screen, color, rect)
+    rect = pygame.Rect(rect)
+    return screen.blit(button_image(color, rect.size, pushed), rect)
+
+
+@functools.lru_cache(maxsize=None)
+def button_image(color, size, pushed):
+    """Return the pre-rendered button image.
+    The color must be hashable, e.g. a color name or an RGB tuple."""
+    image = pygame.Surface(size).convert()
+    rect = pygame.draw.rect(image, color, image.get_rect())
     darker = pygame.Color(color).lerp('black', .5)
     lighter = pygame.Color(color).lerp('whitesmoke', .5)
     if pushed:
         darker, lighter = lighter, darker
     width = 4
     correct = width // 2
-    pygame.draw.line(screen, darker,
+    pygame.draw.line(image, darker,
                      (rect.left, rect.bottom-correct),
                      (rect.right, rect.bottom-correct), width)
-    pygame.draw.line(screen, darker,
+    pygame.draw.line(image, darker,
                      (rect.right-correct, rect.top),
                      (rect.right-correct, rect.bottom), width)
     correct = (width - 1) // 2
-    pygame.draw.line(screen, lighter,
+    pygame.draw.line(image, lighter,
                      (rect.left, rect.top+correct),
                      (rect.right, rect.top+correct), width)
-    pygame.draw.line(screen, lighter,
+    pygame.draw.line(image, lighter,
                      (rect.left+correct, rect.top),
                      (rect.left+correct, rect.bottom), width)
-    return rect
+    return image
 
 
 if __name__ == '__main__':
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""Headless auto-play benchmark of red_black.py.
+
+A bot clicks the button of the most color every frame,
+under the SDL dummy video driver and without the FPS limit.
+Decisions per second and time spent in drawHP, draw_buttons, draw_board
+and event handling are reported as JSON. With --memory, peak memory is
+measured instead, in a run under tracemalloc which would skew the times.
+
+usage: python red_black_bench.py [--frames N] [--board WxH] [--seed N]
+                                 [--memory]
+"""
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+with contextlib.redirect_stdout(sys.stderr):
+    import pygame
+    import red_black
+
+
+class Bot:
+    """Clicks the button of the most color. Resets the board
+    every `reset_every` decisions to measure board swapping too."""
+
+    def __init__(self, reset_every=0):
+        self.reset_every = reset_every
+        self.decisions = 0
+
+    def __call__(self, most_color, btn_rects):
+        pos = btn_rects[most_color].center
+        pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN,
+                                             pos=pos, button=1))
+        pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONUP,
+                                             pos=pos, button=1))
+        self.decisions += 1
+        if self.reset_every and self.decisions % self.reset_every == 0:
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN,
+                                                 key=pygame.K_r))
+
+
+def timed(stats, name, func):
+    """Wrap func to add its seconds to stats[name]."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats[name] = stats.get(name, 0) + time.perf_counter() - start
+    return wrapper
+
+
+def run(frames=1000, board=None, seed=0, live=0, reset_every=10,
+        memory=False):
+    """Run the game with the bot and return the report as a dict.
+    memory: trace the allocations and report the peak instead of times."""
+    if board is not None:
+        red_black.BOARD_SIZE = board
+    red_black.BOARD_SEED = seed
+    red_black.LIVE_FLIPS = live
+    red_black.FPS = 0   # no limit
+
+    stats = {}
+    for name in ('drawHP', 'draw_buttons', 'draw_board'):
+        setattr(red_black, name,
+                timed(stats, name, getattr(red_black, name)))
+
+    bot = Bot(reset_every)
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    red_black.main(bot=bot, frames=frames, stats=stats)
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'frames': frames,
+        'board': list(red_black.BOARD_SIZE),
+        'seed': seed,
+        'live_flips': live,
+        'decisions': bot.decisions,
+    }
+    if memory:
+        report['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        report.update({
+            'decisions_per_sec': bot.decisions / elapsed,
+            'frame_ms': elapsed * 1000 / frames,
+            'breakdown_ms_per_frame': {name: sec * 1000 / frames
+                                       for name, sec in stats.items()},
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=1000)
+    parser.add_argument('--board', default=None, help='WxH, e.g. 2048x2048')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--live', type=int, default=0,
+                        help='cells flipped every frame')
+    parser.add_argument('--reset-every', type=int, default=10,
+                        help='press r every N decisions. 0 for never')
+    parser.add_argument('--memory', action='store_true',
+                        help='report peak memory instead of times')
+    args = parser.parse_args()
+    board = (tuple(int(x) for x in args.board.lower().split('x'))
+             if args.board else None)
+
+    report = run(args.frames, board, args.seed, args.live, args.reset_every,
+                 args.memory)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""spatialhash.py
+Uniform grid spatial hash, a collision broadphase for sprites.
+
+Sprite groups register with a SpatialHash, and it puts their sprites
+into the grid cells which their rects touch. "What might this rect hit"
+looks only at the few cells under the rect, instead of every sprite.
+Any sprite with a `rect` works, e.g. tompong.Bat or mychimp.Chimp.
+"""
+
+from collections import defaultdict
+
+__all__ = ['SpatialHash']
+
+
+class SpatialHash:
+    """Uniform grid of sprite buckets.
+    Functions: register, unregister, rebuild, insert, query, collide
+    Attributes: cell_size, groups"""
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.groups = []
+        self._buckets = defaultdict(list)
+
+    def register(self, group):
+        """Keep the sprites of the group in the grid from the next rebuild."""
+        if group not in self.groups:
+            self.groups.append(group)
+
+    def unregister(self, group):
+        self.groups.remove(group)
+
+    def rebuild(self):
+        """Put the sprites of the registered groups into the grid again.
+        Call it once per tick, after the sprites have moved."""
+        self._buckets.clear()
+        for group in self.groups:
+            for sprite in group:
+                self.insert(sprite)
+
+    def insert(self, sprite):
+        for cell in self._cells(sprite.rect):
+            self._buckets[cell].append(sprite)
+
+    def query(self, rect):
+        """Return the sprites which share a cell with the rect.
+        These are candidates only. They may not collide with the rect."""
+        found = {}   # dict keeps the order and drops duplicates
+        for cell in self._cells(rect):
+            for sprite in self._buckets.get(cell, ()):
+                found[sprite] = None
+        return list(found)
+
+    def collide(self, rect, exclude=None):
+        """Return the sprites whose rects collide with the rect."""
+        return [sprite for sprite in self.query(rect)
+                if sprite is not exclude and rect.colliderect(sprite.rect)]
+
+    def _cells(self, rect):
+        size = self.cell_size
+        for cx in range(rect.left // size, (rect.right - 1) // size + 1):
+            for cy in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                yield cx, cy
@@ -7,11 +7,22 @@
 # Released under the GNU General Public License
 
 # import getopt
+import argparse
+import collections
+import itertools
+import json
 import math
 import os
+import struct
+import time
+import typing
+import zlib
 
+import numpy as np
 import pygame
 
+from spatialhash import SpatialHash
+
 # import random
 # import sys
 # from socket import *
@@ -20,81 +31,200 @@ import pygame
 
 VERSION = '0.4'
 
-
-def load_png(name):
-    """Load image and return image object."""
-
-    fullname = os.path.join('.\\data', name)
-    try:
-        image = pygame.image.load(fullname)
+FPS = 60
+TICK_RATE = 120         # physics ticks per second, whatever the FPS is
+MAX_FRAME_TIME = 0.25   # seconds. Skip ticks rather than spiral down.
+BALL_SPEED = 600 / TICK_RATE   # pixels per tick
+BAT_SPEED = 600 // TICK_RATE   # pixels per tick
+COURT_SIZE = (640, 480)
+RAD = 0.47          # initial direction of the ball
+SPLAT_MIN = 5000    # BallSwarm splats rather than blits this many balls
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Converted images shared by every sprite, keyed by the file path.
+_image_cache = {}
+_image_cache_format = None
+
+
+def _display_format():
+    screen = pygame.display.get_surface()
+    if screen is None:
+        return None
+    return screen.get_bitsize(), screen.get_masks()
+
+
+def load_png(name, copy=False):
+    """Load image and return image object.
+    The image is decoded and converted once, and the same surface is
+    returned to every caller. Pass copy=True to get a private copy
+    which can be drawn on. The cache is dropped when the display
+    format has changed, because converted images depend on it."""
+    global _image_cache_format
+
+    fmt = _display_format()
+    if fmt != _image_cache_format:
+        _image_cache.clear()
+        _image_cache_format = fmt
+
+    fullname = os.path.join(DATA_DIR, name)
+    image = _image_cache.get(fullname)
+    if image is None:
+        try:
+            image = pygame.image.load(fullname)
+        except FileNotFoundError as e:
+            print(f'Cannot load image: {fullname}, {e}')
+            raise SystemExit from e
         # If no display mode has been set,
         # program has terminated when call convert(). why??
         if image.get_alpha() is None:
             image = image.convert()
         else:
             image = image.convert_alpha()
-    except FileNotFoundError as e:
-        print(f'Cannot load image: {fullname}, {e}')
-        raise SystemExit from e
+        _image_cache[fullname] = image
 
+    if copy:
+        image = image.copy()
     return image, image.get_rect()
 
 
+def sweep_aabb(x, y, w, h, dx, dy, target):
+    """Swept AABB test of the (x, y, w, h) box moving by (dx, dy)
+    against the static target rect.
+    Return (time of impact in [0, 1], normal axis 0=x or 1=y),
+    or None if it doesn't hit. Boxes overlapping already don't hit."""
+    entries, exits = [], []
+    for pos, size, d, lo, hi in ((x, w, dx, target.left, target.right),
+                                 (y, h, dy, target.top, target.bottom)):
+        if d > 0:
+            entries.append((lo - (pos + size)) / d)
+            exits.append((hi - pos) / d)
+        elif d < 0:
+            entries.append((hi - pos) / d)
+            exits.append((lo - (pos + size)) / d)
+        elif pos + size <= lo or hi <= pos:
+            return None
+        else:
+            entries.append(-math.inf)
+            exits.append(math.inf)
+    entry = max(entries)
+    if entry < 0 or 1 < entry or min(exits) <= entry:
+        return None
+    return entry, entries.index(entry)
+
+
 class Ball(pygame.sprite.Sprite):
     """A ball that will move across the screen.
     Returns: ball object
-    Functions: update, calcnewpos
-    Attributes: area, vector"""
+    Functions: update, time_of_impact
+    Attributes: area, vector, pos, velocity, missed"""
 
-    def __init__(self, vector, *players):
+    MAX_BOUNCES = 4     # per tick
+
+    def __init__(self, vector, *players, broadphase=None):
+        """broadphase: SpatialHash which the bats are registered with.
+        Without it, the ball tests every player."""
         super().__init__()
-        self.vector = vector
         self.players = players
+        self.broadphase = broadphase
         self.image, self.rect = load_png('pong_ball.png')
+        self.prev_rect = self.rect
+        # Sub-pixel state. The rect is snapped from pos.
+        self.pos = pygame.Vector2(self.rect.topleft)
+        self.prev_pos = pygame.Vector2(self.pos)
+        self._vector = None
+        self.vector = vector
+        self.missed = None  # side whose bat missed the ball in the last tick
         screen = pygame.display.get_surface()
         assert screen is not None
         self.area = screen.get_rect()
-        self.hit = False # is collided by bat?
+
+    @property
+    def vector(self):
+        """(radian, speed). Setting it recomputes the velocity,
+        only if it has changed."""
+        if self._vector is None:
+            self._vector = (math.atan2(self.velocity.y, self.velocity.x),
+                            self.velocity.length())
+        return self._vector
+
+    @vector.setter
+    def vector(self, vector):
+        if vector != self._vector:
+            radian, speed = vector
+            self.velocity = pygame.Vector2(speed * math.cos(radian),
+                                           speed * math.sin(radian))
+            self._vector = vector
 
     def update(self):
-        newpos = self.calcnewpos(self.rect, self.vector)
-        self.rect = newpos
-        radian, speed = self.vector
-
-        if not self.area.contains(newpos):
-            tl = not self.area.collidepoint(newpos.topleft)
-            tr = not self.area.collidepoint(newpos.topright)
-            bl = not self.area.collidepoint(newpos.bottomleft)
-            br = not self.area.collidepoint(newpos.bottomright)
-            if (tl and tr) or (bl and br):
-                radian = -radian
-            if tl and bl:
-                #self.offcourt()
-                radian = math.pi - radian
-            if tr and br:
-                #self.offcourt()
-                radian = math.pi - radian
+        """Advance one physics tick.
+        The ball moves to the exact time of impact with a wall or a bat,
+        is reflected there and moves on for the rest of the tick,
+        so it never tunnels through a bat however fast it is."""
+        self.prev_rect = self.rect
+        self.prev_pos.update(self.pos)
+        self.missed = None
+        x, y = self.pos
+        dx, dy = self.velocity
+
+        remain = 1.0    # of the tick
+        for _ in range(self.MAX_BOUNCES):
+            impact = self.time_of_impact(x, y, dx * remain, dy * remain)
+            if impact is None:
+                break
+            t, axis = impact
+            x, y = x + dx * remain * t, y + dy * remain * t
+            remain *= 1 - t
+            if axis == 0:
+                # A side wall rather than a bat. The ball bounces on.
+                if x <= self.area.left + 0.5:
+                    self.missed = 'left'
+                elif x >= self.area.right - self.rect.width - 0.5:
+                    self.missed = 'right'
+                dx = -dx
+            else:
+                dy = -dy
+            self._vector = None     # angle changed, no trig needed
         else:
-            # Deflate the rectangle,
-            # so you can't catch a ball behind the bat.
-            self.players[0].rect.inflate(-3, -3)
-            self.players[1].rect.inflate(-3, -3)
-
-            # Do ball and bat collide?
-            if self.hit:
-                self.hit = False
-            elif -1 != self.rect.collidelist([self.players[0].rect,
-                                              self.players[1].rect]):
-                radian = math.pi - radian
-                self.hit = True
-
-        self.vector = (radian, speed)
-
-    def calcnewpos(self, rect, vector):
-        """Calculate new position."""
-        rad, spd = vector
-        return rect.move(round(spd * math.cos(rad)), 
-                         round(spd * math.sin(rad)))
+            remain = 0.0
+
+        w, h = self.rect.size
+        self.pos.update(
+            min(max(x + dx * remain, self.area.left), self.area.right - w),
+            min(max(y + dy * remain, self.area.top), self.area.bottom - h))
+        self.velocity.update(dx, dy)
+        self.rect = self.rect.move(round(self.pos.x) - self.rect.x,
+                                   round(self.pos.y) - self.rect.y)
+
+    def time_of_impact(self, x, y, dx, dy):
+        """Return (time in [0, 1], normal axis) of the first impact
+        of the ball at (x, y) moving by (dx, dy), or None."""
+        w, h = self.rect.size
+        impacts = []
+        # Walls. A ball already beyond a wall bounces at once.
+        area = self.area
+        for pos, d, lo, hi, axis in ((x, dx, area.left, area.right - w, 0),
+                                     (y, dy, area.top, area.bottom - h, 1)):
+            if d < 0 and pos + d < lo:
+                impacts.append((max(0.0, (lo - pos) / d), axis))
+            elif d > 0 and pos + d > hi:
+                impacts.append((max(0.0, (hi - pos) / d), axis))
+        # Bats, which may be hit anywhere on the way.
+        swept = pygame.Rect(x, y, w, h).union(
+            pygame.Rect(x + dx, y + dy, w, h)).inflate(2, 2)
+        for bat in self.bats_near(swept):
+            impact = sweep_aabb(x, y, w, h, dx, dy, bat.rect)
+            if impact is not None:
+                impacts.append(impact)
+        return min(impacts, default=None)
+
+    def bats_near(self, rect):
+        """Return the bats which may collide with the rect."""
+        if self.broadphase is None:
+            return self.players
+        return [sprite for sprite in self.broadphase.query(rect)
+                if isinstance(sprite, Bat)]
 
 
 class Bat(pygame.sprite.Sprite):
@@ -110,7 +240,7 @@ class Bat(pygame.sprite.Sprite):
         assert screen is not None
         self.area = screen.get_rect()
         self.side = side
-        self.speed = 10
+        self.speed = BAT_SPEED
         self.state = 'still'
         self.movepos = [0, 0]
         self.reinit()
@@ -121,12 +251,14 @@ class Bat(pygame.sprite.Sprite):
             self.rect.midleft = self.area.midleft
         elif self.side == 'right':
             self.rect.midright = self.area.midright
+        self.prev_rect = self.rect
 
     def update(self):
+        """Advance one physics tick."""
+        self.prev_rect = self.rect
         newpos = self.rect.move(self.movepos)
         if self.area.contains(newpos):
             self.rect = newpos
-        pygame.event.pump()
 
     def moveup(self):
         self.movepos[1] -= self.speed
@@ -141,76 +273,558 @@ class Bat(pygame.sprite.Sprite):
         self.movepos = [0, 0]
 
 
-def main():
+def predict_intercept(x, y, vx, vy, target_x, top, bottom):
+    """Return the y of the ball at (x, y) moving by (vx, vy) per tick
+    when it reaches target_x, or nan if it heads away.
+    The top and bottom walls, between which y stays, are folded in
+    as a triangle wave, so any number of bounces costs the same.
+    Takes scalars or numpy arrays of the same shape."""
+    span = bottom - top
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.subtract(target_x, x) / vx
+        travel = np.mod(np.add(y, np.multiply(vy, t)) - top, 2 * span)
+        return np.where(t >= 0, top + span - np.abs(travel - span), np.nan)
+
+
+class BatAI:
+    """Computer player which moves a bat to where the ball will cross it.
+    Returns: AI object
+    Functions: update
+    Attributes: bat, ball, delay, error"""
+
+    def __init__(self, bat, ball, delay=6, error=0.0, seed=None):
+        """delay: reaction time in ticks. The AI sees the ball as it was
+        that many ticks ago.
+        error: standard deviation of the aim in pixels, drawn once
+        for every approach of the ball."""
+        self.bat = bat
+        self.ball = ball
+        self.delay = delay
+        self.error = error
+        self.rng = np.random.default_rng(seed)
+        self.seen = collections.deque(maxlen=delay + 1)
+        self.heading = None
+        self.miss = 0.0
+
+    def update(self):
+        """Steer the bat for the next physics tick."""
+        ball, bat = self.ball, self.bat
+        self.seen.append((tuple(ball.pos), tuple(ball.velocity)))
+        (x, y), (vx, vy) = self.seen[0]
+
+        left = bat.side == 'left'
+        heading = vx < 0 if left else vx > 0
+        if heading != self.heading:
+            self.heading = heading
+            self.miss = self.rng.normal(0, self.error) if self.error else 0.0
+
+        w, h = ball.rect.size
+        area = ball.area
+        aim = math.nan
+        if heading:
+            target_x = bat.rect.right if left else bat.rect.left - w
+            aim = predict_intercept(x, y, vx, vy, target_x,
+                                    area.top, area.bottom - h) + self.miss
+        if math.isnan(aim):
+            # Heading away, or already behind the bat. Back to the middle.
+            aim = area.centery - h / 2
+        diff = aim + h / 2 - bat.rect.centery
+
+        state = ('still' if abs(diff) < bat.speed
+                 else 'movedown' if diff > 0 else 'moveup')
+        if state != bat.state:
+            bat.movestop()
+            if state == 'moveup':
+                bat.moveup()
+            elif state == 'movedown':
+                bat.movedown()
+
+
+class BallSwarm:
+    """Thousands of balls stepped together in numpy arrays.
+    Bounces on the walls and the bats like Ball,
+    but for every ball in a few array operations.
+    Functions: update, draw
+    Attributes: pos, vel"""
+
+    def __init__(self, n, speed, bats, seed=None):
+        self.image, rect = load_png('pong_ball.png')
+        self.size = np.array(rect.size, dtype=float)
+        self.bats = bats
+        screen = pygame.display.get_surface()
+        assert screen is not None
+        self.area = screen.get_rect()
+        self.lo = np.array(self.area.topleft, dtype=float)
+        self.hi = np.array(self.area.bottomright, dtype=float) - self.size
+
+        rng = np.random.default_rng(seed)
+        self.pos = rng.uniform(self.lo, self.hi, size=(n, 2))
+        radian = rng.uniform(0, 2 * math.pi, size=n)
+        self.vel = np.column_stack((np.cos(radian), np.sin(radian))) * speed
+        self.prev = self.pos.copy()
+
+    def __len__(self):
+        return len(self.pos)
+
+    def update(self):
+        """Advance one physics tick."""
+        self.prev[:] = self.pos
+        pos, vel = self.pos, self.vel
+        pos += vel
+
+        # Walls: mirror the overshoot back into the court.
+        under, over = pos < self.lo, pos > self.hi
+        np.copyto(pos, 2 * self.lo - pos, where=under)
+        np.copyto(pos, 2 * self.hi - pos, where=over)
+        np.negative(vel, out=vel, where=under | over)
+
+        # Bats: turn back the balls which overlap a bat and head to it.
+        x, y = pos[:, 0], pos[:, 1]
+        w, h = self.size
+        for bat in self.bats:
+            r = bat.rect
+            hit = ((x < r.right) & (x + w > r.left)
+                   & (y < r.bottom) & (y + h > r.top)
+                   & ((r.centerx - (x + w / 2)) * vel[:, 0] > 0))
+            np.negative(vel[:, 0], out=vel[:, 0], where=hit)
+
+    def draw(self, surface, alpha=1.0):
+        """Draw every ball with one batched blits call.
+        Over SPLAT_MIN balls, blitting is bound by overdraw, so the balls
+        are splatted as a coverage map instead. Its cost depends on the
+        surface size only."""
+        pos = (self.prev + (self.pos - self.prev) * alpha).astype(int)
+        if len(pos) < SPLAT_MIN:
+            surface.blits(zip(itertools.repeat(self.image), pos.tolist()),
+                          doreturn=False)
+        else:
+            self._splat(surface, pos)
+
+    def _splat(self, surface, pos):
+        """Draw the union of the ball shapes at once. The ball is a
+        single-colored shape on a colorkey, so the image is the ball
+        mask convolved with the ball top-left positions."""
+        w, h = surface.get_size()
+        iw, ih = self.image.get_size()
+        shape = (h + ih, w + iw)
+        if getattr(self, '_kernel_shape', None) != shape:
+            if self.image.get_colorkey() is None:
+                kernel = pygame.surfarray.array_alpha(self.image)
+            else:
+                kernel = pygame.surfarray.array_colorkey(self.image)
+            padded = np.zeros(shape)
+            padded[:ih, :iw] = kernel.T > 0
+            self._kernel_fft = np.fft.rfft2(padded)
+            self._kernel_shape = shape
+            self._color = surface.map_rgb(
+                self.image.get_at(self.image.get_rect().center))
+
+        x = np.clip(pos[:, 0], 0, w - 1)
+        y = np.clip(pos[:, 1], 0, h - 1)
+        occupied = np.bincount(y * shape[1] + x,
+                               minlength=shape[0] * shape[1])
+        coverage = np.fft.irfft2(
+            np.fft.rfft2(occupied.reshape(shape)) * self._kernel_fft,
+            s=shape)[:h, :w] > 0.5
+        pixels = pygame.surfarray.pixels2d(surface)
+        pixels[coverage.T] = self._color
+        del pixels
+
+
+class ScoreBoard:
+    """Scores drawn from digit glyphs which are rendered once into an atlas.
+    The scores are drawn on the background, so clearing the sprites
+    over them keeps them, and they are redrawn only when they change.
+    Returns: scoreboard object
+    Functions: score, draw
+    Attributes: scores, rect"""
+
+    GAP = 40    # pixels between the two scores
+
+    def __init__(self, background, size=64, color='grey60', top=10):
+        self.background = background
+        self.backdrop = background.copy()
+        font = pygame.font.Font(None, size)
+        glyphs = [font.render(str(digit), True, color) for digit in range(10)]
+        # Monospace cells, so the scores don't jitter as they change.
+        self.cell = pygame.Rect(0, 0,
+                                max(glyph.get_width() for glyph in glyphs),
+                                max(glyph.get_height() for glyph in glyphs))
+        self.atlas = pygame.Surface(
+            (self.cell.width * 10, self.cell.height)).convert(background)
+        self.atlas.fill(background.get_at((0, 0)))
+        for digit, glyph in enumerate(glyphs):
+            self.atlas.blit(glyph, glyph.get_rect(
+                center=self.cell.move(self.cell.width * digit, 0).center))
+        self.centerx = background.get_rect().centerx
+        self.top = top
+        self.scores = [0, 0]    # left, right
+        self.drawn = None
+        self.rect = pygame.Rect(self.centerx, top, 0, 0)
+
+    def score(self, missed):
+        """Give a point to the opponent of the side which missed."""
+        self.scores[missed == 'left'] += 1
+
+    def _glyphs(self, text, x):
+        w = self.cell.width
+        return [(self.atlas, (x + w * i, self.top),
+                 self.cell.move(w * int(char), 0))
+                for i, char in enumerate(text)]
+
+    def draw(self, screen):
+        """Redraw the scores on the background and the screen if they
+        have changed, and return the dirty rects.
+        Draw it after clearing and before drawing the sprites."""
+        if self.drawn == self.scores:
+            return []
+        self.drawn = list(self.scores)
+        left, right = map(str, self.scores)
+        half = self.GAP // 2
+        blits = (self._glyphs(left, self.centerx - half
+                              - self.cell.width * len(left))
+                 + self._glyphs(right, self.centerx + half))
+
+        old = self.rect
+        self.background.blit(self.backdrop, old, old)
+        drawn = self.background.blits(blits)
+        self.rect = drawn[0].unionall(drawn[1:])
+        dirty = old.union(self.rect)
+        screen.blit(self.background, dirty, dirty)
+        return [dirty]
+
+
+def interpolate(sprite, alpha):
+    """Return the position of the sprite between the last two ticks.
+    Sprites with sub-pixel `pos` and `prev_pos` snap only here."""
+    if hasattr(sprite, 'prev_pos'):
+        pos = sprite.prev_pos.lerp(sprite.pos, alpha)
+        return round(pos.x), round(pos.y)
+    prev, cur = sprite.prev_rect, sprite.rect
+    return (round(prev.x + (cur.x - prev.x) * alpha),
+            round(prev.y + (cur.y - prev.y) * alpha))
+
+
+class InterpolatedGroup(pygame.sprite.RenderPlain):
+    """Group which draws sprites between their previous and current
+    physics positions. Sprites need `prev_rect` as well as `rect`.
+    draw returns the dirty rects, where the sprites were and are,
+    to present with pygame.display.update."""
+
+    def draw(self, surface, alpha=1.0):
+        sprites = self.sprites()
+        drawn = surface.blits(
+            [(spr.image, interpolate(spr, alpha)) for spr in sprites])
+        dirty = self.lostsprites
+        for spr, new in zip(sprites, drawn):
+            old = self.spritedict[spr]
+            if not old:
+                dirty.append(new)
+            elif old.colliderect(new):
+                dirty.append(old.union(new))
+            else:
+                dirty += (old, new)
+            self.spritedict[spr] = new
+        self.lostsprites = []
+        return dirty
+
+
+# Keys which are recorded. The code of an input is index << 1 | pressed.
+INPUT_KEYS = (pygame.K_a, pygame.K_z, pygame.K_UP, pygame.K_DOWN)
+LOG_MAGIC = b'TPNG'
+LOG_VERSION = 1
+LOG_EVENT = struct.Struct('<IB')    # tick, code
+LOG_END = 0xFF                      # code of the last record
+LOG_CRC = struct.Struct('<I')       # trajectory checksum after LOG_END
+
+
+class InputSnapshot(typing.NamedTuple):
+    """Input of one frame, sampled once by sample_input.
+    Attributes: held, edges, pressed, released, mouse_pos, mouse_buttons,
+    quit"""
+
+    held: frozenset         # INPUT_KEYS down after the frame's events
+    edges: tuple            # (key, pressed) of INPUT_KEYS in event order
+    mouse_pos: tuple
+    mouse_buttons: tuple
+    quit: bool
+
+    @property
+    def pressed(self):
+        return frozenset(key for key, down in self.edges if down)
+
+    @property
+    def released(self):
+        return frozenset(key for key, down in self.edges if not down)
+
+
+def sample_input():
+    """Pump the event queue once and return the InputSnapshot of it.
+    Call it as late as possible before the physics ticks."""
+    edges = []
+    quit = False
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            quit = True
+        elif (event.type in (pygame.KEYDOWN, pygame.KEYUP)
+                and event.key in INPUT_KEYS):
+            edges.append((event.key, event.type == pygame.KEYDOWN))
+    keys = pygame.key.get_pressed()
+    return InputSnapshot(frozenset(key for key in INPUT_KEYS if keys[key]),
+                         tuple(edges), pygame.mouse.get_pos(),
+                         pygame.mouse.get_pressed(), quit)
+
+
+def apply_input(key, pressed, player1, player2):
+    """Move the bats for a press or a release of the key."""
+    if pressed:
+        if key == pygame.K_a:
+            player1.moveup()
+        if key == pygame.K_z:
+            player1.movedown()
+        if key == pygame.K_UP:
+            player2.moveup()
+        if key == pygame.K_DOWN:
+            player2.movedown()
+    else:
+        if key in (pygame.K_a, pygame.K_z):
+            player1.movestop()
+        if key in (pygame.K_UP, pygame.K_DOWN):
+            player2.movestop()
+
+
+def trajectory_crc(crc, ball):
+    """Add the ball position of a tick to the trajectory checksum."""
+    return zlib.crc32(struct.pack('<dd', ball.pos.x, ball.pos.y), crc)
+
+
+class InputRecorder:
+    """Writes every input with the physics tick it applies to,
+    5 bytes per input, and a checksum of the ball trajectory at the end.
+    Functions: record, tick, close"""
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(LOG_MAGIC + bytes([LOG_VERSION]))
+        self.crc = 0
+
+    def record(self, tick, key, pressed):
+        self.file.write(LOG_EVENT.pack(tick, INPUT_KEYS.index(key) << 1
+                                       | bool(pressed)))
+
+    def tick(self, ball):
+        self.crc = trajectory_crc(self.crc, ball)
+
+    def close(self, ticks):
+        if self.file.closed:
+            return
+        self.file.write(LOG_EVENT.pack(ticks, LOG_END) + LOG_CRC.pack(self.crc))
+        self.file.close()
+
+
+def read_input_log(path):
+    """Return ([(tick, key, pressed)], number of ticks, trajectory crc)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != LOG_MAGIC or data[4:5] != bytes([LOG_VERSION]):
+        raise ValueError(f'Not a pong input log: {path}')
+    inputs = []
+    offset = 5
+    while offset + LOG_EVENT.size <= len(data):
+        tick, code = LOG_EVENT.unpack_from(data, offset)
+        offset += LOG_EVENT.size
+        if code == LOG_END:
+            if offset + LOG_CRC.size > len(data):
+                break
+            (crc,) = LOG_CRC.unpack_from(data, offset)
+            return inputs, tick, crc
+        if code >> 1 >= len(INPUT_KEYS):
+            raise ValueError(f'Bad input code {code} in pong input log: '
+                             f'{path}')
+        inputs.append((tick, INPUT_KEYS[code >> 1], bool(code & 1)))
+    raise ValueError(f'Truncated pong input log: {path}')
+
+
+def replay(path):
+    """Replay the input log as fast as possible, without drawing.
+    Return the measures and whether the ball took the recorded path.
+    Needs a display surface, e.g. under the SDL dummy video driver."""
+    inputs, ticks, recorded_crc = read_input_log(path)
+    if pygame.display.get_surface() is None:
+        pygame.display.init()
+        pygame.display.set_mode(COURT_SIZE)
+
+    # Same court as main.
+    player1 = Bat('left')
+    player2 = Bat('right')
+    players = pygame.sprite.Group(player1, player2)
+    broadphase = SpatialHash(128)
+    broadphase.register(players)
+    broadphase.rebuild()
+    ball = Ball((RAD, BALL_SPEED), player1, player2, broadphase=broadphase)
+
+    crc = 0
+    scores = [0, 0]
+    pending = iter(inputs)
+    upcoming = next(pending, None)
+    start = time.perf_counter()
+    for tick in range(ticks):
+        while upcoming is not None and upcoming[0] == tick:
+            apply_input(upcoming[1], upcoming[2], player1, player2)
+            upcoming = next(pending, None)
+        ball.update()
+        if ball.missed:
+            scores[ball.missed == 'left'] += 1
+        players.update()
+        broadphase.rebuild()
+        crc = trajectory_crc(crc, ball)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'ticks': ticks,
+        'inputs': len(inputs),
+        'scores': scores,
+        'seconds': elapsed,
+        'ticks_per_sec': ticks / elapsed if elapsed else float('inf'),
+        'crc': crc,
+        'matches': crc == recorded_crc,
+    }
+
+
+def main(swarm=0, record=None, ai=()):
+    """swarm: number of balls in a BallSwarm instead of the single ball.
+    record: path to write the input log to. Not with swarm.
+    ai: sides, 'left' and/or 'right', played by BatAI. Not with swarm."""
     pygame.init()
     # Initialize screen
-    screen = pygame.display.set_mode((640, 480))
+    screen = pygame.display.set_mode(COURT_SIZE)
     pygame.display.set_caption('Basic Pong')
 
     # Fill background
     background = pygame.Surface(screen.get_size()).convert()
     background.fill('black')
+    hud = ScoreBoard(background)
 
     # Initialize players
     player1 = Bat('left')
     player2 = Bat('right')
 
     # Initialize ball
-    BALL_SPEED = 10
-    RAD = 0.47
     # rand = ((0.1 * (random.randint(5,8))))
-    ball = Ball((RAD, BALL_SPEED), player1, player2)
+    players = InterpolatedGroup(player1, player2)
+    broadphase = SpatialHash(128)
+    broadphase.register(players)
+    broadphase.rebuild()
+    if swarm:
+        ball_swarm = BallSwarm(swarm, BALL_SPEED, (player1, player2))
+        ball = None
+    else:
+        ball_swarm = None
+        ball = Ball((RAD, BALL_SPEED), player1, player2,
+                    broadphase=broadphase)
 
     # Initialize  sprites
-    players = pygame.sprite.RenderPlain(player1, player2)
-    balls = pygame.sprite.RenderPlain(ball)
+    balls = InterpolatedGroup(*filter(None, [ball]))
+    bots = [BatAI(player, ball) for player in (player1, player2)
+            if ball and player.side in ai]
+    # Keys of the bats which the AI plays are ignored.
+    human_keys = {key for key, player in zip(INPUT_KEYS, (player1, player1,
+                                                          player2, player2))
+                  if player.side not in ai}
 
     # Blit everything to the screen.
     screen.blit(background, (0, 0))
     pygame.display.flip()
 
     # Initialize clock
-    FPS = 60
     clock = pygame.time.Clock()
+    tick = 1 / TICK_RATE
+    lag = 0.0   # simulated time which hasn't been ticked yet
+    ticks = 0   # physics ticks done
+    recorder = InputRecorder(record) if record and ball else None
 
-    while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                return
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_a:
-                    player1.moveup()
-                if event.key == pygame.K_z:
-                    player1.movedown()
-                if event.key == pygame.K_UP:
-                    player2.moveup()
-                if event.key == pygame.K_DOWN:
-                    player2.movedown()
-            elif event.type == pygame.KEYUP:
-                if event.key in (pygame.K_a, pygame.K_z):
-                    player1.movestop()
-                if event.key in (pygame.K_UP, pygame.K_DOWN):
-                    player2.movestop()
-
-        # screen.blit(background, ball.rect)
-        # screen.blit(background, player1.rect)
-        # screen.blit(background, player2.rect)
-        balls.clear(screen, background)
-        players.clear(screen, background)
-
-        balls.update()
-        players.update()
-
-        balls.draw(screen)
-        players.draw(screen)
-
-        # pygame.display.flip()
-        pygame.display.update(None)
+    # The log is ended however the game ends, so that it can be replayed.
+    try:
+        while True:
+            # Make sure game run in FPS.
+            lag += min(clock.tick(FPS) / 1000, MAX_FRAME_TIME)
 
-        # Make sure game run in 60 fps.
-        clock.tick(FPS)
+            # The only pump of the frame, right before the physics.
+            inputs = sample_input()
+            if inputs.quit:
+                return
+            for key, pressed in inputs.edges:
+                if key not in human_keys:
+                    continue
+                # Inputs of this frame apply from the next tick.
+                apply_input(key, pressed, player1, player2)
+                if recorder:
+                    recorder.record(ticks, key, pressed)
+
+            # screen.blit(background, ball.rect)
+            # screen.blit(background, player1.rect)
+            # screen.blit(background, player2.rect)
+            # Physics runs in fixed ticks, decoupled from the frame rate.
+            while lag >= tick:
+                for bot in bots:
+                    bot.update()
+                balls.update()
+                if ball and ball.missed:
+                    hud.score(ball.missed)
+                if ball_swarm:
+                    ball_swarm.update()
+                players.update()
+                broadphase.rebuild()
+                if recorder:
+                    recorder.tick(ball)
+                ticks += 1
+                lag -= tick
+
+            if ball_swarm:
+                screen.blit(background, (0, 0))
+            else:
+                balls.clear(screen, background)
+            players.clear(screen, background)
+
+            alpha = lag / tick
+            dirty = hud.draw(screen)
+            dirty += balls.draw(screen, alpha)
+            if ball_swarm:
+                ball_swarm.draw(screen, alpha)
+            dirty += players.draw(screen, alpha)
+
+            # pygame.display.flip()
+            # Present only where the sprites were and are. The swarm
+            # covers the whole court anyway.
+            pygame.display.update(None if ball_swarm else dirty)
+    finally:
+        if recorder:
+            recorder.close(ticks)
+        pygame.quit()
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Tom's Pong")
+    parser.add_argument('--swarm', type=int, default=0, metavar='N',
+                        help='play with N balls stepped as a BallSwarm')
+    parser.add_argument('--record', metavar='FILE',
+                        help='record the inputs to replay them later')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='replay recorded inputs headless and at full '
+                             'speed, and print the measures as JSON')
+    parser.add_argument('--ai', choices=('left', 'right', 'both'),
+                        help='let the computer play the bat(s)')
+    args = parser.parse_args()
+    if args.record and args.swarm:
+        parser.error('--record works with the single ball only')
+    if args.ai and args.swarm:
+        parser.error('--ai works with the single ball only')
+    if args.ai and args.record:
+        parser.error('--record works with human players only')
+    ai = (('left', 'right') if args.ai == 'both'
+          else (args.ai,) if args.ai else ())
+    if args.replay:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        print(json.dumps(replay(args.replay), indent=2))
+    else:
+        main(swarm=args.swarm, record=args.record, ai=ai)
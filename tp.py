@@ -15,6 +15,7 @@ import getopt
 import pygame
 from socket import *
 from pygame.locals import *
+from tompong import load_png  # shares tompong's process-wide image cache
 # try:
 #     import sys
 #     import random
@@ -28,20 +29,6 @@ from pygame.locals import *
 #     print(f"couldn't load module. {err}")
 #     sys.exit(2)
 
-def load_png(name):
-    """ Load image and return image object"""
-    fullname = os.path.join("data", name)
-    try:
-        image = pygame.image.load(fullname)
-        if image.get_alpha is None:
-            image = image.convert()
-        else:
-            image = image.convert_alpha()
-    except FileNotFoundError:
-        print(f"Cannot load image: {fullname}")
-        raise SystemExit
-    return image, image.get_rect()
-
 class Ball(pygame.sprite.Sprite):
     """A ball that will move across the screen
     Returns: ball object
@@ -53,11 +40,26 @@ class Ball(pygame.sprite.Sprite):
         self.image, self.rect = load_png("pong_ball.png")
         screen = pygame.display.get_surface()
         self.area = screen.get_rect()
+        # Float position, snapped to the rect only for drawing
+        self.pos = pygame.Vector2(self.rect.topleft)
+        self._vector = None
         self.vector = vector
         self.hit = 0
 
+    @property
+    def vector(self):
+        return self._vector
+
+    @vector.setter
+    def vector(self, vector):
+        # Trig only when the angle or the speed has changed
+        if vector != self._vector:
+            (angle,z) = vector
+            self.velocity = pygame.Vector2(z*math.cos(angle),z*math.sin(angle))
+            self._vector = vector
+
     def update(self):
-        newpos = self.calcnewpos(self.rect,self.vector)
+        self.pos, newpos = self.calcnewpos(self.rect,self.pos,self.velocity)
         self.rect = newpos
         (angle,z) = self.vector
 
@@ -94,10 +96,10 @@ class Ball(pygame.sprite.Sprite):
                 self.hit = not self.hit
         self.vector = (angle,z)
 
-    def calcnewpos(self,rect,vector):
-        (angle,z) = vector
-        (dx,dy) = (z*math.cos(angle),z*math.sin(angle))
-        return rect.move(dx,dy)
+    def calcnewpos(self,rect,pos,velocity):
+        # Return the float position moved by velocity, and the rect snapped to it
+        pos = pos + velocity
+        return pos, rect.move(round(pos.x) - rect.x, round(pos.y) - rect.y)
 
 class Bat(pygame.sprite.Sprite):
     """Movable tennis 'bat' with which one hits the ball